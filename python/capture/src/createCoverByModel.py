@@ -1,24 +1,56 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+from pathlib import Path
+
+# Linux 下走 EGL 的 GPU 离屏渲染，需在导入 pyrender 之前设置
+if sys.platform.startswith("linux"):
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
 import trimesh
 import pyrender
 import numpy as np
 import cv2
-import os
 
+# 渲染器初始视口大小，之后按模型调整
+BASE_VIEWPORT_WIDTH = 800
+BASE_VIEWPORT_HEIGHT = 600
+
+# 并行渲染的进程数，单 GPU 下 2~4 个上下文比较合适
+MAX_RENDER_WORKERS = min(os.cpu_count() or 1, 4)
+
+# 工作进程内的渲染器，首次渲染时创建
+_worker_renderer = None
 
-def generate_glb_cover(glb_file_path, output_image_path):
+def _load_model(glb_file_path):
     # 加载 GLB 文件
-    mesh = trimesh.load_mesh(glb_file_path)
+    # 跳过顶点合并等预处理，只用于渲染预览
+    mesh = trimesh.load_mesh(glb_file_path, file_type="glb", process=False)
 
-    # 如果是场景，合并所有网格
+    # 如果是场景，合并所有网格；只有一个网格时直接使用，避免整份拷贝
     if isinstance(mesh, trimesh.Scene):
         meshes = list(mesh.geometry.values())
-        combined_mesh = trimesh.util.concatenate(meshes)
+        if len(meshes) == 1:
+            combined_mesh = meshes[0]
+        else:
+            combined_mesh = trimesh.util.concatenate(meshes)
     else:
         combined_mesh = mesh
 
-    # 计算最小边界框
+    # 不做平滑，避免逐顶点重算法线
+    pyr_mesh = pyrender.Mesh.from_trimesh(combined_mesh, smooth=False)
+    # 相机对准包围盒中心即可，不用按面积加权的质心
     bounds = combined_mesh.bounds
-    center = combined_mesh.centroid
+    center = 0.5 * (bounds[0] + bounds[1])
+    return pyr_mesh, bounds, center
+
+
+def generate_glb_cover(glb_file_path, output_image_path, renderer=None, flat=True):
+    # 加载模型
+    pyr_mesh, bounds, center = _load_model(glb_file_path)
+
+    # 计算最小边界框
     extent = bounds[1] - bounds[0]
     max_extent = np.max(extent)
 
@@ -29,11 +61,13 @@ def generate_glb_cover(glb_file_path, output_image_path):
     print(f"Y-axis extent: {y_extent}")
     print(f"Z-axis extent: {z_extent}")
 
-    # 创建一个 Pyrender 场景
-    scene = pyrender.Scene()
+    # 创建一个 Pyrender 场景，平面着色时只用环境光，光照渲染保持默认场景
+    if flat:
+        scene = pyrender.Scene(ambient_light=[0.5, 0.5, 0.5])
+    else:
+        scene = pyrender.Scene()
 
     # 将网格添加到场景中
-    pyr_mesh = pyrender.Mesh.from_trimesh(combined_mesh)
     scene.add(pyr_mesh)
 
     # 添加相机
@@ -44,17 +78,23 @@ def generate_glb_cover(glb_file_path, output_image_path):
     camera_pose[:3, 3] = center + np.array([0, 0, camera_distance])
     scene.add(camera, pose=camera_pose)
 
-    # 添加光源
-    light = pyrender.DirectionalLight(color=[1.0, 1.0, 1.0], intensity=1.5)
+    if flat:
+        # 平面着色不做光照计算，也不剔除背面
+        render_flags = pyrender.RenderFlags.FLAT | pyrender.RenderFlags.SKIP_CULL_FACES
+    else:
+        render_flags = pyrender.RenderFlags.NONE
+
+        # 添加光源
+        light = pyrender.DirectionalLight(color=[1.0, 1.0, 1.0], intensity=1.5)
 
-    # 计算光源位置，使其位于相机的45度角上方
-    light_distance = camera_distance * np.sqrt(2)  # 45度角的距离
-    light_offset = np.array([0, light_distance / 2, light_distance / 2])
-    light_pose = np.eye(4)
-    light_pose[:3, 3] = center + light_offset
+        # 计算光源位置，使其位于相机的45度角上方
+        light_distance = camera_distance * np.sqrt(2)  # 45度角的距离
+        light_offset = np.array([0, light_distance / 2, light_distance / 2])
+        light_pose = np.eye(4)
+        light_pose[:3, 3] = center + light_offset
 
-    # 添加光源到场景中
-    scene.add(light, pose=light_pose)
+        # 添加光源到场景中
+        scene.add(light, pose=light_pose)
 
     # # 添加点光源以模拟环绕光
     # point_light = pyrender.PointLight(color=[1.0, 1.0, 1.0], intensity=2.0)
@@ -75,28 +115,40 @@ def generate_glb_cover(glb_file_path, output_image_path):
         viewport_width = int(base_width / x_extent * scale_factor)
         viewport_height = int(viewport_width * (z_extent / x_extent))
 
-    # 创建渲染器
-    r = pyrender.OffscreenRenderer(
-        viewport_width=viewport_width, viewport_height=viewport_height
-    )
+    # 复用传入的渲染器，只调整视口大小；未传入时临时创建
+    own_renderer = renderer is None
+    if own_renderer:
+        r = pyrender.OffscreenRenderer(
+            viewport_width=viewport_width, viewport_height=viewport_height
+        )
+    else:
+        r = renderer
+        r.viewport_width = viewport_width
+        r.viewport_height = viewport_height
 
     print(f"Bounding viewport width: {viewport_width}")
     print(f"Bounding viewport height: {viewport_height}")
 
     # 渲染场景
-    color, depth = r.render(scene)
+    color, depth = r.render(scene, flags=render_flags)
 
-    # 找到非零深度值的像素
-    non_zero_depth = np.nonzero(depth)
-    if non_zero_depth[0].size == 0 or non_zero_depth[1].size == 0:
+    # 释放临时创建的渲染器资源
+    if own_renderer:
+        r.delete()
+
+    # 按行、列归约出有深度值的像素范围
+    mask = depth > 0
+    rows = np.any(mask, axis=1)
+    cols = np.any(mask, axis=0)
+    if not rows.any():
         # 如果没有找到任何非零深度值，返回默认值或抛出异常
         return (0, 0), (viewport_width, viewport_height)
 
     # 计算最小包围框的左上角和右下角坐标
-    min_x = np.min(non_zero_depth[1])
-    min_y = np.min(non_zero_depth[0])
-    max_x = np.max(non_zero_depth[1])
-    max_y = np.max(non_zero_depth[0])
+    min_y = np.argmax(rows)
+    max_y = len(rows) - 1 - np.argmax(rows[::-1])
+    min_x = np.argmax(cols)
+    max_x = len(cols) - 1 - np.argmax(cols[::-1])
 
     left_top = (min_x, min_y)
     right_bottom = (max_x, max_y)
@@ -116,32 +168,86 @@ def generate_glb_cover(glb_file_path, output_image_path):
     # # 渲染场景
     # color, depth = r.render(scene)
 
+    # 先裁剪以去除四周的空白区域，再在一块内存里拼出 BGRA 图像
+    cropped_color = color[min_y:max_y+1, min_x:max_x+1]
+    cropped_mask = mask[min_y:max_y+1, min_x:max_x+1]
+    bgra = np.empty(cropped_color.shape[:2] + (4,), dtype=np.uint8)
+    # 颜色通道直接按 BGR 顺序写入，省去 cvtColor 的整图拷贝
+    bgra[..., :3] = cropped_color[..., ::-1]
     # 根据深度信息创建透明度通道
-    alpha = np.where(depth > 0, 255, 0).astype(np.uint8)
+    np.multiply(cropped_mask, 255, out=bgra[..., 3], casting="unsafe")
 
-    # 将颜色通道和透明度通道合并成 RGBA 图像
-    rgba = np.dstack((color, alpha)).astype(np.uint8)
+    # 保存渲染结果为带有透明背景的 PNG 图片，先在内存中编码再一次性写入
+    ok, png = cv2.imencode(".png", bgra)
+    if ok:
+        Path(output_image_path).write_bytes(png.tobytes())
+
+
+def is_preview_up_to_date(glb_file_path, output_image_path):
+    return os.path.exists(output_image_path) and os.path.getmtime(
+        output_image_path
+    ) >= os.path.getmtime(glb_file_path)
+
+
+def _release_worker_renderer():
+    global _worker_renderer
+    if _worker_renderer is not None:
+        _worker_renderer.delete()
+        _worker_renderer = None
+
+
+def _init_worker():
+    # 每个工作进程各自持有一个 EGL 上下文和渲染器；PYOPENGL_PLATFORM 已在模块导入时设置。
+    # fork/forkserver 启动的工作进程以 os._exit() 退出，不会执行 atexit，
+    # 改为注册 multiprocessing 的终结器，在进程退出前释放渲染器
+    Finalize(None, _release_worker_renderer, exitpriority=10)
 
-    # 裁剪图像以去除四周的空白区域
-    cropped_rgba = rgba[min_y:max_y+1, min_x:max_x+1]
-    
-    # 保存渲染结果为带有透明背景的 PNG 图片
-    cv2.imwrite(output_image_path, cv2.cvtColor(cropped_rgba, cv2.COLOR_RGBA2BGRA))
 
-    # 释放渲染器资源
-    r.delete()
+def _render_one(task):
+    global _worker_renderer
+    glb_file_path, output_image_path = task
+    if _worker_renderer is None:
+        _worker_renderer = pyrender.OffscreenRenderer(
+            viewport_width=BASE_VIEWPORT_WIDTH, viewport_height=BASE_VIEWPORT_HEIGHT
+        )
+    generate_glb_cover(glb_file_path, output_image_path, _worker_renderer)
 
 
 # 新增函数：遍历文件夹并生成预览图
-def generate_previews_from_folder(folder_path):
-    for root, dirs, files in os.walk(folder_path):
-        for dir_name in dirs:
-            print(dir_name)
-            subfolder_path = os.path.join(root, dir_name)
-            glb_file_path = os.path.join(subfolder_path, "model.glb")
-            if os.path.exists(glb_file_path):
-                output_image_path = os.path.join(subfolder_path, "preview.png")
-                generate_glb_cover(glb_file_path, output_image_path)
+def generate_previews_from_folder(folder_path, max_workers=MAX_RENDER_WORKERS):
+    tasks = []
+    # 用 scandir 逐层遍历子文件夹，目录项自带类型和 stat 信息，不再逐个 stat
+    pending = [folder_path]
+    while pending:
+        subfolder_path = pending.pop()
+        glb_entry = None
+        preview_entry = None
+        with os.scandir(subfolder_path) as it:
+            for entry in it:
+                # 与 os.walk 默认的 followlinks=False 一致，不进入符号链接目录，避免链接成环时无限遍历
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name == "model.glb" and entry.is_file():
+                    glb_entry = entry
+                elif entry.name == "preview.png":
+                    preview_entry = entry
+
+        if glb_entry is None or subfolder_path == folder_path:
+            continue
+        print(os.path.basename(subfolder_path))
+        output_image_path = os.path.join(subfolder_path, "preview.png")
+        # 预览图已存在且不早于模型文件则跳过
+        if (
+            preview_entry is not None
+            and preview_entry.stat().st_mtime >= glb_entry.stat().st_mtime
+        ):
+            print("预览图已存在，跳过生成")
+            continue
+        tasks.append((glb_entry.path, output_image_path))
+
+    # 各模型互不依赖，分发到多个进程并行渲染
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+        list(executor.map(_render_one, tasks))
 
 
 # 新增函数：指定文件夹并生成预览图
@@ -149,6 +255,9 @@ def generate_previews_from_assign_folder(folder_path):
     glb_file_path = os.path.join(folder_path, "model.glb")
     if os.path.exists(glb_file_path):
         output_image_path = os.path.join(folder_path, "preview.png")
+        if is_preview_up_to_date(glb_file_path, output_image_path):
+            print("预览图已存在，跳过生成")
+            return
         generate_glb_cover(glb_file_path, output_image_path)
 
 
@@ -1,15 +1,38 @@
+import json
 import os
 import requests
 import pandas as pd
-import json
+from ast import literal_eval
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from utils.mysql import UsingMysql, get_connection
+from utils.http import create_session
 
 # 每批读取的行数
 batch_size = 100
 
-# 初始化计数器
-counter = 1
+# 上一批最后一条记录的 id，按主键分页
+last_id = 0
+
+# 并发下载线程数
+max_workers = 8
+
+# 复用连接的会话
+session = create_session()
+
+
+# 解析 origin_video_opt 中的源文件地址，该列保存的是 JSON；
+# 旧数据保存的是 dict 的 repr，JSON 解析失败时再按 repr 解析
+def parse_video_source(opt):
+    try:
+        return json.loads(opt).get("source")
+    except (TypeError, ValueError, AttributeError):
+        pass
+    try:
+        return literal_eval(opt).get("source")
+    except (ValueError, SyntaxError, AttributeError):
+        print(f"Failed to parse video opt from {opt}")
+        return None
 
 
 def download_files_from_db(http_url):
@@ -38,11 +61,11 @@ def download_files_from_db(http_url):
         #     for data in tqdm(response.iter_content(block_size), total=total_size // block_size, unit='KB', unit_scale=True, desc=file_name, ascii=True):
         #         f.write(data)
 
-        response = requests.get(http_url, stream=True)
+        response = session.get(http_url, stream=True)
         response.raise_for_status()  # 检查请求是否成功
 
         total_size = int(response.headers.get("content-length", 0))
-        block_size = 8192  # 8 Kibibyte
+        block_size = 65536  # 64 Kibibyte
 
         with open(file_path, "wb") as f:
             with tqdm(
@@ -67,24 +90,19 @@ if __name__ == "__main__":
 
     connection = get_connection()
     with UsingMysql(log_time=True) as um:
-        batch_df = pd.read_sql(
-            "select * from tb_video where source_type='pixabay' LIMIT %s OFFSET %s",
-            connection,
-            params=(batch_size, (counter - 1) * batch_size),
-        )
-        if not batch_df.empty:
+        while True:
+            batch_df = pd.read_sql(
+                "select * from tb_video where source_type='pixabay' and id > %s order by id LIMIT %s",
+                connection,
+                params=(last_id, batch_size),
+            )
+            if batch_df.empty:
+                break
+            last_id = int(batch_df["id"].iat[-1])
+
             # 导出数据到文件
-            download_urls = []
-            for index, row in batch_df.iterrows():
-                opt = row["origin_video_opt"]
-                try:
-                    # 替换单引号为双引号
-                    opt_dict = json.loads(opt.replace("'", '"'))
-                    http_url = opt_dict.get("source")  # 假设字典中有 'http_url' 键
-                    if http_url:
-                        # http_url = http_url.replace("_source", "")
-                        download_files_from_db(http_url)
-                        
-                        # download_urls.append(http_url)
-                except json.JSONDecodeError:
-                    print(f"Failed to decode JSON from {opt}")
+            download_urls = (
+                batch_df["origin_video_opt"].map(parse_video_source).dropna().tolist()
+            )
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(download_files_from_db, download_urls))
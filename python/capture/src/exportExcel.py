@@ -1,5 +1,6 @@
 import os
 import pandas as pd
+import pymysql
 from utils.mysql import UsingMysql, get_connection
 
 # 每批读取的行数
@@ -14,21 +15,23 @@ if __name__ == "__main__":
     if not os.path.exists(excel_folder):
         os.makedirs(excel_folder)
 
-    connection = get_connection()
+    # 使用服务端游标，一条查询流式分批读取整张表
+    connection = get_connection(cursorclass=pymysql.cursors.SSCursor)
     with UsingMysql(log_time=True) as um:
 
-        while True:
-            batch_df = pd.read_sql(
-                "select * from tb_video where source_type='pixabay' LIMIT %s OFFSET %s",
-                connection,
-                params=(batch_size, (counter - 1) * batch_size),
-            )
-            if batch_df.empty:
-                break
-
-            # 导出数据到文件
+        for batch_df in pd.read_sql(
+            "select * from tb_video where source_type='pixabay'",
+            connection,
+            chunksize=batch_size,
+        ):
+            # 导出数据到文件，xlsxwriter 常量内存模式逐行写出
             file_name = f"excel/data_{counter}.xlsx"
-            batch_df.to_excel(file_name, index=False)
+            batch_df.to_excel(
+                file_name,
+                index=False,
+                engine="xlsxwriter",
+                engine_kwargs={"options": {"constant_memory": True}},
+            )
 
             print(f"导出 {file_name} 成功")
 
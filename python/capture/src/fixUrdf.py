@@ -1,26 +1,23 @@
 import os
-import xml.etree.ElementTree as ET
+from lxml import etree
 
 def parse_urdf_file(file_path):
     try:
-        tree = ET.parse(file_path)
+        tree = etree.parse(file_path)
         root = tree.getroot()
 
-        for joint in root.findall('joint'):
+        for joint in root.iterfind('joint'):
             name = joint.get('name')
             axis = joint.find('axis')
             if axis is not None:
-                xyz = axis.get('xyz')
-                # 转为float类型
-                xyz_list = xyz.split()
-                xyz = [float(x) for x in xyz_list]
-                # 空格拼接后覆盖回urdf文件
-                joint.find('axis').set('xyz', ' '.join(str(x) for x in xyz))
+                # 转为float类型后空格拼接，覆盖回urdf文件
+                xyz = ' '.join(str(float(x)) for x in axis.get('xyz').split())
+                axis.set('xyz', xyz)
                 print(f"Joint Name: {name}, Axis XYZ: {xyz}")
 
         # 保存文件
-        tree.write(file_path)
-    except ET.ParseError as e:
+        tree.write(file_path, xml_declaration=True, encoding='utf-8')
+    except etree.XMLSyntaxError as e:
         print(f"Error parsing {file_path}: {e}")
 
 def main(directory):
@@ -1,12 +1,23 @@
+import json
 import pandas as pd
 from utils.mysql import UsingMysql
 
+# 每批更新的行数
+batch_size = 1000
+
+
+# 按固定大小切分列表
+def _batched(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
 
 if __name__ == "__main__":
 
     with UsingMysql(log_time=True) as um:
         um.cursor.execute("select * from tb_video where source_type='pixabay'")
         result = um.cursor.fetchall()
+        rows = []
         for item in result:
             origin_video_url = item["origin_video_url"]
             splitResult = origin_video_url.split("_tiny")
@@ -17,15 +28,17 @@ if __name__ == "__main__":
                 "large": splitResult[0] + "_large" + splitResult[1],
                 "source": splitResult[0] + splitResult[1],
             }
-            print(item['id'], str(dict))
-            um.cursor.execute(
-                "update tb_video set origin_video_opt = %s where id = %s",
-                (str(dict), item["id"]),
+            rows.append((json.dumps(dict), item["id"]))
+
+        # 批量更新，整体放在一个事务中提交
+        for chunk in _batched(rows, batch_size):
+            um.cursor.executemany(
+                "update tb_video set origin_video_opt = %s where id = %s", chunk
             )
 
-        um._conn.commit
+        um._conn.commit()
 
-        print(result)
+        print(f"更新 {len(rows)} 条记录")
 
 
 # 创建一个示例数据框
@@ -1,5 +1,4 @@
 from DrissionPage import ChromiumPage
-import time
 import logging
 import pandas as pd
 import os
@@ -81,13 +80,13 @@ class GoogleScholarSpider:
             # 打开页面
             logger.info(f"正在打开页面: {self.base_url}")
             self.page.get(self.base_url)
-            time.sleep(3)  # 等待页面加载
+            self._wait_for_results()  # 等待结果列表出现
 
             # 检查是否有验证码或 403 错误
             if self._check_for_captcha():
                 logger.warning("检测到验证码或访问限制，尝试刷新页面...")
                 self.page.refresh()
-                time.sleep(5)
+                self._wait_for_results()
                 if self._check_for_captcha():
                     logger.error("仍然存在验证码或访问限制，无法继续爬取")
                     return []
@@ -109,8 +108,8 @@ class GoogleScholarSpider:
         :return: 如果有验证码或访问限制则返回 True，否则返回 False
         """
         try:
-            # 检查 403 错误
-            if "403. That's an error" in self.page.html:
+            # 检查 403 错误，只探测标题元素，避免序列化整个页面
+            if self.page.ele('xpath://title[contains(text(),"Error")]', timeout=0.1):
                 return True
             # 检查验证码元素
             if self.page.ele("tag:div@@id:recaptcha", timeout=1):
@@ -119,6 +118,14 @@ class GoogleScholarSpider:
         except Exception:
             return False
 
+    def _wait_for_results(self, timeout: float = 10) -> bool:
+        """
+        等待结果列表渲染完成
+        :param timeout: 超时时间（秒）
+        :return: 结果列表出现返回 True，超时返回 False
+        """
+        return bool(self.page.wait.ele_displayed("#gs_res_ccl", timeout=timeout))
+
     def _extract_items(self):
         """提取当前页面上的所有条目"""
         try:
@@ -181,7 +188,8 @@ class GoogleScholarSpider:
                 # 点击下一页
                 logger.info("正在点击下一页")
                 next_link.parent().click(by_js=True)
-                time.sleep(5)  # 等待页面加载
+                self.page.wait.load_start()
+                self._wait_for_results()  # 等待页面加载
 
                 # 检查是否有验证码或 403 错误
                 if self._check_for_captcha():
@@ -1,9 +1,13 @@
-import pandas as pd
-import requests
 import os
 import logging
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
+from openpyxl import load_workbook
+from urllib.parse import urlsplit
+from utils.http import create_session
 
 # 配置日志
 logging.basicConfig(
@@ -16,22 +20,76 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class RateLimiter:
+    """
+    线程安全的滑动窗口限流器，period 秒内最多放行 max_calls 次请求
+    """
+    def __init__(self, max_calls: int = 4, period: float = 1.0):
+        self.max_calls = max_calls
+        self.period = period
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        阻塞直到可以发起下一次请求
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                # 移除窗口外的请求记录
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                wait_time = self.period - (now - self._calls[0])
+            time.sleep(wait_time)
+
+class HostRateLimiter:
+    """
+    按域名分别限流，每个域名各自持有一个 RateLimiter
+    """
+    def __init__(self, max_calls: int = 4, period: float = 1.0):
+        self.max_calls = max_calls
+        self.period = period
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        """
+        阻塞直到可以向该URL所在域名发起下一次请求
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = RateLimiter(self.max_calls, self.period)
+        limiter.wait()
+
 class GoogleSpiderDownloader:
     """
     用于从Google Scholar爬虫导出的Excel文件中下载arXiv论文的类
     将URL中的 `https://arxiv.org/abs` 替换为 `https://arxiv.org/pdf` 后下载PDF文件
     """
-    def __init__(self, excel_path: str = 'google_scholar_results.xlsx', output_dir: str = 'downloads'):
+    def __init__(self, excel_path: str = 'google_scholar_results.xlsx', output_dir: str = 'downloads',
+                 max_calls: int = 4, period: float = 1.0):
         """
         初始化下载器
         Args:
             excel_path: Excel文件路径，默认为'google_scholar_results.xlsx'
             output_dir: 下载文件保存目录，默认为'downloads'
+            max_calls: 每个域名在一个时间窗口内允许的最大请求数，默认为4
+            period: 限流时间窗口(秒)，默认为1秒
         """
         self.excel_path = excel_path
         self.output_dir = output_dir
         self.base_url_abs = 'https://arxiv.org/abs'
         self.base_url_pdf = 'https://arxiv.org/pdf'
+        # 复用连接的会话
+        self.session = create_session()
+        # 按域名限流
+        self.rate_limiter = HostRateLimiter(max_calls, period)
         
         # 创建输出目录
         if not os.path.exists(self.output_dir):
@@ -49,26 +107,38 @@ class GoogleSpiderDownloader:
                 logger.error(f'Excel文件不存在: {self.excel_path}')
                 return []
 
-            df = pd.read_excel(self.excel_path)
-            logger.info(f'成功读取Excel文件: {self.excel_path}，共 {len(df)} 条记录')
+            # 只读模式流式读取，无需整表加载为DataFrame
+            wb = load_workbook(self.excel_path, read_only=True, data_only=True)
+            try:
+                ws = wb.active
+                rows = ws.iter_rows(values_only=True)
+                header = list(next(rows, ()))
 
-            # 检查是否包含'link'列
-            if 'link' not in df.columns:
-                logger.warning('Excel文件中未找到名为"link"的列')
-                return []
+                # 检查是否包含'link'列
+                if 'link' not in header:
+                    logger.warning('Excel文件中未找到名为"link"的列')
+                    return []
+                link_idx = header.index('link')
+                title_idx = header.index('title') if 'title' in header else None
 
-            # 过滤出包含arxiv链接的记录
-            arxiv_records = []
-            for _, row in df.iterrows():
-                link = str(row['link'])
-                if self.base_url_abs in link:
-                    # 替换URL
-                    pdf_link = link.replace(self.base_url_abs, self.base_url_pdf) + '.pdf'
-                    arxiv_records.append({
-                        'title': str(row.get('title', '未命名')),
-                        'abs_link': link,
-                        'pdf_link': pdf_link
-                    })
+                # 过滤出包含arxiv链接的记录
+                arxiv_records = []
+                row_count = 0
+                for row in rows:
+                    row_count += 1
+                    link = str(row[link_idx])
+                    if self.base_url_abs in link:
+                        title = row[title_idx] if title_idx is not None else None
+                        # 替换URL
+                        pdf_link = link.replace(self.base_url_abs, self.base_url_pdf) + '.pdf'
+                        arxiv_records.append({
+                            'title': str(title if title is not None else '未命名'),
+                            'abs_link': link,
+                            'pdf_link': pdf_link
+                        })
+            finally:
+                wb.close()
+            logger.info(f'成功读取Excel文件: {self.excel_path}，共 {row_count} 条记录')
 
             logger.info(f'找到 {len(arxiv_records)} 条包含arXiv链接的记录')
             return arxiv_records
@@ -92,23 +162,33 @@ class GoogleSpiderDownloader:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'
             }
 
+            # 文件存在时先发HEAD请求，只有服务器给出的大小与本地不一致时才重新下载；
+            # 没有Content-Length或HEAD失败时无法判断是否完整，按已存在跳过
+            if os.path.exists(save_path):
+                self.rate_limiter.wait(pdf_link)
+                try:
+                    head = self.session.head(pdf_link, headers=headers, timeout=30, allow_redirects=True)
+                    content_length = head.headers.get('content-length') if head.ok else None
+                except Exception as e:
+                    logger.warning(f'HEAD请求失败: {str(e)}, URL: {pdf_link}')
+                    content_length = None
+                if content_length is None or int(content_length) == os.path.getsize(save_path):
+                    logger.info(f'文件已存在，跳过下载: {save_path}')
+                    return True
+                logger.info(f'文件不完整，重新下载: {save_path}')
+
+            self.rate_limiter.wait(pdf_link)
+
             logger.info(f'开始下载: {pdf_link}')
-            response = requests.get(pdf_link, headers=headers, timeout=30, stream=True)
+            response = self.session.get(pdf_link, headers=headers, timeout=30, stream=True)
 
             if response.status_code == 200:
                 # 确保目录存在
                 os.makedirs(os.path.dirname(save_path), exist_ok=True)
 
-                
-                # 文件存在则跳过
-                if os.path.exists(save_path):
-                    print("文件已存在，跳过下载")
-                    return
-
-
                 # 写入文件
                 with open(save_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
+                    for chunk in response.iter_content(chunk_size=65536):
                         f.write(chunk)
                 logger.info(f'下载成功: {save_path}')
                 return True
@@ -120,11 +200,11 @@ class GoogleSpiderDownloader:
             logger.error(f'下载文件时发生错误: {str(e)}, URL: {pdf_link}')
             return False
 
-    def batch_download(self, delay: int = 3) -> int:
+    def batch_download(self, max_workers: int = 4) -> int:
         """
         批量下载PDF文件
         Args:
-            delay: 下载间隔时间(秒)，默认为3秒
+            max_workers: 并发下载线程数，默认为4
         Returns:
             成功下载的文件数量
         """
@@ -133,27 +213,37 @@ class GoogleSpiderDownloader:
             logger.warning('没有找到可下载的记录')
             return 0
 
-        success_count = 0
-        for i, record in enumerate(records, 1):
-            logger.info(f'正在处理第 {i}/{len(records)} 条记录')
+        # 已提交的链接和保存路径，截断后的标题可能重复，避免多个线程同时写入同一个文件
+        submitted_links = set()
+        used_paths = set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for record in records:
+                pdf_link = record['pdf_link']
+                if pdf_link in submitted_links:
+                    logger.info(f'链接重复，跳过: {pdf_link}')
+                    continue
+                submitted_links.add(pdf_link)
+
+                # 生成保存文件名
+                title = record['title'].replace(':', '').replace('/', '_').replace('\\', '_')
+                # 取标题前30个字符，避免文件名过长
+                short_title = title[:30] if len(title) > 30 else title
+                save_path = os.path.join(self.output_dir, f'{short_title}.pdf')
 
-            # 生成保存文件名
-            title = record['title'].replace(':', '').replace('/', '_').replace('\\', '_')
-            # 取标题前30个字符，避免文件名过长
-            short_title = title[:30] if len(title) > 30 else title
-            save_path = os.path.join(self.output_dir, f'{short_title}.pdf')
+                # 不同论文的标题前30个字符相同时，文件名依次加上序号
+                suffix = 1
+                while os.path.normcase(save_path) in used_paths:
+                    suffix += 1
+                    save_path = os.path.join(self.output_dir, f'{short_title}_{suffix}.pdf')
+                used_paths.add(os.path.normcase(save_path))
 
-            # 下载文件
-            if self.download_pdf(record['pdf_link'], save_path):
-                success_count += 1
+                # 提交下载任务
+                futures.append(executor.submit(self.download_pdf, pdf_link, save_path))
 
-            # 添加延迟，避免请求过快
-            if i < len(records):
-                logger.info(f'等待 {delay} 秒后继续下载')
-                time.sleep(delay)
+            success_count = sum(1 for future in futures if future.result())
 
-        logger.info(f'批量下载完成，共成功下载 {success_count}/{len(records)} 个文件')
-        time.sleep(5)
+        logger.info(f'批量下载完成，共成功下载 {success_count}/{len(futures)} 个文件')
         return success_count
 
 def main():
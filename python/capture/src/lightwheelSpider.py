@@ -1,9 +1,15 @@
 # 这是爬取 lightWheel.ai 的脚本
 # 通过http的方式
-import requests
 import json
+import math
+import orjson
 import os
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from utils.http import create_session
+
+# 复用连接的会话
+session = create_session()
 
 
 # 分页获取,POST请求
@@ -12,64 +18,65 @@ def post_lightwheel(url, body):
         "Content-Type": "application/json",
         "Accept": "application/json",
     }
-    response = requests.post(url, headers=headers, data=json.dumps(body))
+    response = session.post(url, headers=headers, data=json.dumps(body))
     return response.json()
 
 
-# 控制分页变量，并循环调用post_lightweel
-def get_lightwheel_spider(url):
-    pageNum = 1
+# 控制分页变量，并发调用post_lightweel获取所有分页
+def get_lightwheel_spider(url, max_workers=8):
     pageSize = 1000
     body = {
-        "page": pageNum,
+        "page": 1,
         "pageSize": pageSize,
         "query": {"name": "", "assetTypes": ["Manipulation", "Locomotion"]},
     }
-    # while True:
-    body["page"] = pageNum
+    # 先请求第一页，读取总数
     result = post_lightwheel(url, body)
-    # 读取 data
-    data = result["data"]
-    # 读取data.records
-    records = data["records"]
-    print(len(records))
-    # 遍历records 写入到 本地txt文件
-    # for record in records:
-    # json格式化后保存到本地数据库
-    with open("lightwheel.txt", "a", encoding="utf-8") as f:
-        f.write(json.dumps(records, ensure_ascii=False) + "\n")
-
-        # if result["data"]["total"] == 0:
-        # break
-
-
-# 读取lightwheel.txt文件，转换成json对象，遍历json对象
-def read_lightwheel_txt():
-    with open("lightwheel.txt", "r", encoding="utf-8") as f:
+    total = result["data"]["total"]
+    pages = math.ceil(total / pageSize)
+    print(f"共 {total} 条记录，{pages} 页")
+
+    # 其余分页互不依赖，并发请求
+    results = [result]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results.extend(
+            executor.map(
+                lambda page: post_lightwheel(url, {**body, "page": page}),
+                range(2, pages + 1),
+            )
+        )
+
+    # 每页的 records json格式化后一行，一次写入到本地txt文件
+    lines = []
+    for result in results:
+        records = result["data"]["records"]
+        print(len(records))
+        lines.append(json.dumps(records, ensure_ascii=False) + "\n")
+    with open("lightwheel.txt", "w", encoding="utf-8") as f:
+        f.write("".join(lines))
+
+
+# 读取lightwheel.txt文件，转换成json对象，遍历json对象并发下载
+def read_lightwheel_txt(max_workers=16):
+    tasks = []
+    with open("lightwheel.txt", "rb") as f:
         for line in f:
-            json_obj = json.loads(line)
+            json_obj = orjson.loads(line)
             for record in json_obj:
-                file_url = record["fileUrl"]
-                download_file(file_url)
+                tasks.append((record["fileUrl"], ""))
 
                 name = record["name"]
                 images = record["images"]
 
-                num = 0
-                for image in images:
-                    download_file(image["fileUrl"], f"{name}_{num}")
-                    num = num + 1
+                for num, image in enumerate(images):
+                    tasks.append((image["fileUrl"], f"{name}_{num}"))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda task: download_file(*task), tasks))
 
 
 # 下载fileUrl对象
 def download_file(file_url, file_name=""):
-    # 配置超时时间为1小时
-    requests.adapters.DEFAULT_RETRIES = 5
-    session = requests.Session()
-    session.keep_alive = False
-    session.mount("http://", requests.adapters.HTTPAdapter(max_retries=5))
-    session.mount("https://", requests.adapters.HTTPAdapter(max_retries=5))
-    session.timeout = 3600
     print(file_url)
 
     # 解析文件名
@@ -79,8 +86,7 @@ def download_file(file_url, file_name=""):
         file_name = file_name + "." + file_url.split(".")[-1]
 
     # 创建lightwheel文件夹
-    if not os.path.exists("lightwheel"):
-        os.mkdir("lightwheel")
+    os.makedirs("lightwheel", exist_ok=True)
 
     # 拼接本地路径
     file_path = os.path.join("lightwheel", file_name)
@@ -92,13 +98,14 @@ def download_file(file_url, file_name=""):
             print("文件已存在，跳过下载")
             return
 
-        response = requests.get(file_url)
+        # 配置超时时间为1小时
+        response = session.get(file_url, stream=True, timeout=3600)
 
         # 下载显示进度
         print(f"正在下载文件: {file_name}")
         response.raise_for_status()
         total_size = int(response.headers.get("content-length", 0))
-        block_size = 1024
+        block_size = 65536
 
         # 创建进度条
         progress_bar = tqdm(
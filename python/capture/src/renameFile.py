@@ -2,15 +2,15 @@ import os
 import shutil
 
 def rename_files_in_directory(directory):
-    # 获取文件夹中的所有文件
-    files = os.listdir(directory)
-    files.sort()  # 确保文件按顺序排列
+    # 获取文件夹中的所有文件，scandir 的目录项自带文件类型，无需逐个 stat
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda entry: entry.name)  # 确保文件按顺序排列
 
     # 重命名文件
-    for i, filename in enumerate(files):
-        if os.path.isfile(os.path.join(directory, filename)):
+    for i, entry in enumerate(entries):
+        if entry.is_file():
             # 获取文件名和扩展名
-            name, ext = os.path.splitext(filename)
+            name, ext = os.path.splitext(entry.name)
             # 创建同名文件夹
             new_folder = os.path.join(directory, f"{i + 1}")
             if not os.path.exists(new_folder):
@@ -20,7 +20,7 @@ def rename_files_in_directory(directory):
             # 构造新的文件路径
             new_file_path = os.path.join(new_folder, new_filename)
             # 移动文件到新文件夹
-            shutil.move(os.path.join(directory, filename), new_file_path)
+            shutil.move(entry.path, new_file_path)
 
 # 示例调用
 rename_files_in_directory(r'C:\\Users\\drenc\\Desktop\\test\\material\\20250513\\')
\ No newline at end of file
@@ -1,66 +1,159 @@
+import math
+import mmap
+import os
 import re
-from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+
+    # 按分组编号求每组时间的最小值和最大值，编译后在一次循环内完成
+    @njit(cache=True)
+    def _minmax_by_group(ts, gids, n_groups):
+        lo = np.full(n_groups, np.iinfo(np.int64).max)
+        hi = np.full(n_groups, np.iinfo(np.int64).min)
+        for i in range(ts.size):
+            g = gids[i]
+            v = ts[i]
+            if v < lo[g]:
+                lo[g] = v
+            if v > hi[g]:
+                hi[g] = v
+        return lo, hi
 
 
 def group_logs_by_keyword(log_file_path, keyword_pattern):
-    # 用于存储分组结果的字典，键为关键字，值为对应的日志行列表
-    log_groups = defaultdict(list)
+    # 每个关键字只保存汇总状态 [最早毫秒数, 最晚毫秒数, 是否成功]，不保留原始日志行
+    state = {}
+
+    # 预编译 bytes 正则，直接在内存映射的文件上匹配，无需逐行解码
+    kw_pattern = re.compile(keyword_pattern.encode("utf-8"))
 
     # 读取日志文件
-    with open(log_file_path, "r", encoding="utf-8") as file:
-        for line in file:
-            line = line.strip()
-            # 使用正则表达式查找关键字
-            match = re.search(keyword_pattern, line)
-            if match:
+    with open(log_file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # 空文件不能映射，直接写出空结果，覆盖上次运行留下的 result.txt
+            save_result(state)
+            return state
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            prev_start = -1
+            for match in kw_pattern.finditer(mm):
+                # 找到关键字所在行的起止位置，同一行只统计第一次匹配
+                start = mm.rfind(b"\n", 0, match.start()) + 1
+                if start == prev_start:
+                    continue
+                prev_start = start
+                end = mm.find(b"\n", match.end())
+                if end < 0:
+                    end = len(mm)
+                line = mm[start:end].strip()
+
                 # 提取关键字
-                keyword = match.group(0)
-                # 将当前行添加到对应关键字的列表中
-                log_groups[keyword].append(line)
+                keyword = match.group(0).decode("utf-8")
+                s = state.get(keyword)
+                if s is None:
+                    s = state[keyword] = [math.inf, -math.inf, False]
+
+                # 判断line中是否同时存在 train3d_only 和success，
+                # 已成功的关键字不再扫描，未找到 train3d_only 时不再查找 Success
+                if not s[2] and line.find(b"train3d_only") >= 0:
+                    s[2] = line.find(b"Success") >= 0
+
+                # 行首时间格式是 hh:mm:ss.sss，直接按字节位置换算为毫秒整数，
+                # Caused 开头的行不满足该格式，无需单独过滤
+                if len(line) > 11 and line[2] == 58 and line[5] == 58 and line[8] == 46:
+                    t = (
+                        ((line[0] - 48) * 10 + (line[1] - 48)) * 3600000
+                        + ((line[3] - 48) * 10 + (line[4] - 48)) * 60000
+                        + ((line[6] - 48) * 10 + (line[7] - 48)) * 1000
+                        + (line[9] - 48) * 100
+                        + (line[10] - 48) * 10
+                        + (line[11] - 48)
+                    )
+                    if t < s[0]:
+                        s[0] = t
+                    if t > s[1]:
+                        s[1] = t
 
+    save_result(state)
+    return state
+
+
+# 将运行时长大于45分钟的关键字保存到 txt 文件
+def save_result(state, result_path="result.txt"):
     strs = []
 
-    # 输出分组结果
-    for keyword, lines in log_groups.items():
-        # 将每行中的用空格分割，然后读取第一个字符串作为时间，比较所有行中的时间，时间格式是 hh:mm:ss.sss，如果大于45分钟，则输出
-        times = [line.split()[0] for line in lines if not line.startswith("Caused")]
-        #  过滤 times = caused 的
-        # 将 %H:%M:%S.%f 转换为秒数
-        times = [
-            int(time.split(":")[0]) * 3600
-            + int(time.split(":")[1]) * 60
-            + float(time.split(":")[2])
-            for time in times
-        ]
-
-        # 判断line中是否同时存在 train3d_only 和success
-        hasSuccess = False
-        for line in lines:
-            if "train3d_only" in line and "Success" in line:
-                hasSuccess = True
-
-        # if hasSuccess:
-        #     strs.append(f"{keyword} has been running for {(max(times) - min(times)) / 60:.2f} minutes. {hasSuccess}")
-
-        if max(times) - min(times) > 45 * 60 :  # 45 分钟
+    # 输出分组结果，运行时长大于45分钟的输出
+    for keyword, (min_t, max_t, hasSuccess) in state.items():
+        if max_t - min_t > 45 * 60000:  # 45 分钟
             # 打印时长，以分钟为单位
-            # print(f"{keyword} has been running for {(max(times) - min(times)) / 60:.2f} minutes.")
             strs.append(
-                f"{keyword} has been running for {(max(times) - min(times)) / 60:.2f} minutes. {hasSuccess}"
+                f"{keyword} has been running for {(max_t - min_t) / 60000:.2f} minutes. {hasSuccess}"
             )
-            # print(f"{keyword}: {lines}")
-            # print(f"{keyword} has been running for more than 45 minutes.")
-            # print(f"{keyword}: {lines}")
-            # 将同一关键字的所有日志行合并成一行，用制表符分隔
-            # combined_line = "\t".join(lines)
-            # print(f"{keyword}: {combined_line}")
 
     # 保存结果到  txt 文件
-    with open("result.txt", "w", encoding="utf-8") as file:
+    with open(result_path, "w", encoding="utf-8") as file:
         for str in strs:
             file.write(str + "\n")
 
-    return log_groups
+
+# 大日志文件使用 pandas 按列批量解析，逐行的工作都在 C 层完成
+def group_logs_by_keyword_vectorized(log_file_path, keyword_pattern):
+    # 按字节一次读入，整体解码一次
+    with open(log_file_path, "rb") as file:
+        lines = pd.Series(file.read().decode("utf-8").splitlines()).str.strip()
+
+    # 提取关键字，只保留包含关键字的行
+    keywords = lines.str.extract(f"({keyword_pattern})", expand=True)[0]
+    has_keyword = keywords.notna()
+    lines = lines[has_keyword]
+    keywords = keywords[has_keyword]
+
+    # 行首时间 hh:mm:ss.sss 换算为毫秒，Caused 开头的行不参与计时
+    parts = lines.str.extract(r"^(?!Caused)(\d\d):(\d\d):(\d\d)\.(\d\d\d)", expand=True)
+    parts = parts.apply(pd.to_numeric)
+    ms = parts[0] * 3600000 + parts[1] * 60000 + parts[2] * 1000 + parts[3]
+
+    # 判断line中是否同时存在 train3d_only 和success
+    has_success = lines.str.contains("train3d_only", regex=False) & lines.str.contains(
+        "Success", regex=False
+    )
+
+    if njit is not None:
+        # 关键字映射为连续的分组编号，由编译后的循环求最值
+        gids, uniques = pd.factorize(keywords, sort=False)
+        valid = ms.notna().to_numpy()
+        lo, hi = _minmax_by_group(
+            ms.to_numpy()[valid].astype(np.int64), gids[valid], len(uniques)
+        )
+        hs = np.bincount(gids, weights=has_success.to_numpy(), minlength=len(uniques)) > 0
+        # 没有时间的关键字按原逻辑不参与时长统计
+        state = {
+            keyword: [int(lo[g]), int(hi[g]), bool(hs[g])]
+            for g, keyword in enumerate(uniques)
+            if lo[g] <= hi[g]
+        }
+    else:
+        df = pd.DataFrame({"keyword": keywords, "ms": ms, "has_success": has_success})
+        agg = df.groupby("keyword", sort=False).agg(
+            min=("ms", "min"), max=("ms", "max"), has_success=("has_success", "any")
+        )
+        # 没有时间的关键字按原逻辑不参与时长统计
+        agg = agg.dropna(subset=["min", "max"])
+        state = {
+            keyword: [int(row.min), int(row.max), bool(row.has_success)]
+            for keyword, row in zip(agg.index, agg.itertuples(index=False))
+        }
+
+    save_result(state)
+    return state
 
 
 # 使用示例
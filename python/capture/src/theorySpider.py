@@ -1,12 +1,19 @@
-import requests
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+import httpx
 import pandas as pd
 import logging
 import os
-from bs4 import BeautifulSoup
-import time
+from lxml import html as lxml_html
 from typing import List, Dict
-import json 
+from urllib.parse import urlsplit
+import orjson
 import re
+import sqlite3
+from utils.http import create_session
 
 # 配置日志
 logging.basicConfig(
@@ -19,35 +26,183 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 请求头，模拟浏览器，显式开启压缩传输
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36',
+    'Accept-Encoding': 'gzip, deflate'
+}
+
+# IEEE页面中保存论文元数据的变量
+IEEE_METADATA_TOKEN = b'xplGlobal.document.metadata='
+# JSON 中影响括号层级的字节：花括号、引号和转义符，其余字节由正则引擎直接跳过
+JSON_STRUCTURE_PATTERN = re.compile(rb'[{}"\\]')
+
+# 本地网页缓存（SQLite），重复运行时直接读取磁盘，缓存有效期7天
+CACHE_PATH = 'theory_spider_cache.sqlite'
+CACHE_EXPIRE_AFTER = 7 * 86400
+
+# 流式读取响应的块大小
+CHUNK_SIZE = 64 * 1024
+# 读到这些标记后即可停止读取：citation_author 都在 <head> 中
+HEAD_END_MARKERS = (b'</head>',)
+
+
+class _PageCache:
+    """
+    按URL缓存已读取的网页内容（读到停止标记为止的部分），异步和线程池两种请求方式共用
+    """
+    def __init__(self, path: str, expire_after: float):
+        self.expire_after = expire_after
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS pages '
+                               '(url TEXT PRIMARY KEY, content BLOB, fetched_at REAL)')
+
+    def get(self, url: str):
+        """
+        读取未过期的缓存内容
+        Returns:
+            网页内容，未命中返回None
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT content FROM pages WHERE url = ? AND fetched_at >= ?',
+                                     (url, time.time() - self.expire_after)).fetchone()
+        return row[0] if row else None
+
+    def set(self, url: str, content: bytes):
+        """
+        写入网页内容
+        """
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?)',
+                               (url, content, time.time()))
+
+class _MarkerScanner:
+    """
+    在不断追加的缓冲区中依次查找多个标记，已扫描过的部分不再重复查找
+    """
+    def __init__(self, markers: tuple):
+        self.markers = markers
+        self.buf = bytearray()
+        self._pos = 0
+        self._index = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        追加数据块
+        Returns:
+            所有标记都已出现返回True
+        """
+        self.buf += chunk
+        while self._index < len(self.markers):
+            marker = self.markers[self._index]
+            found = self.buf.find(marker, self._pos)
+            if found < 0:
+                self._pos = max(self._pos, len(self.buf) - len(marker) + 1)
+                return False
+            self._pos = found + len(marker)
+            self._index += 1
+        return True
+
+class _IeeeMetadataScanner:
+    """
+    查找IEEE元数据变量，并按括号层级确认其后的JSON对象已完整读取
+    （字符串中也可能出现 };，不能以此作为结束标记）
+    """
+    def __init__(self):
+        self.buf = bytearray()
+        self._pos = 0
+        self._start = -1
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        追加数据块
+        Returns:
+            元数据JSON对象已闭合返回True
+        """
+        self.buf += chunk
+        if self._start < 0:
+            found = self.buf.find(IEEE_METADATA_TOKEN, self._pos)
+            if found < 0:
+                self._pos = max(self._pos, len(self.buf) - len(IEEE_METADATA_TOKEN) + 1)
+                return False
+            self._start = found + len(IEEE_METADATA_TOKEN)
+        return _find_json_object_end(self.buf, self._start) >= 0
+
+# 各类页面停止读取条件的扫描器工厂
+HEAD_SCANNER = partial(_MarkerScanner, HEAD_END_MARKERS)
+IEEE_METADATA_SCANNER = _IeeeMetadataScanner
+
+def _find_json_object_end(content: bytes, start: int) -> int:
+    """
+    从start处的 { 开始按括号层级匹配JSON对象，跳过字符串内的括号和转义字符
+    Args:
+        content: 网页原始内容
+        start: JSON对象起始位置
+    Returns:
+        对象结束位置（不含），未闭合返回-1
+    """
+    if content[start:start + 1] != b'{':
+        return -1
+    depth = 0
+    in_str = False
+    escaped_at = -1
+    for match in JSON_STRUCTURE_PATTERN.finditer(content, start):
+        i = match.start()
+        # 被转义的字符不参与匹配
+        if i == escaped_at:
+            continue
+        c = content[i]
+        if c == 0x5c:
+            escaped_at = i + 1
+        elif in_str:
+            if c == 0x22:
+                in_str = False
+        elif c == 0x22:
+            in_str = True
+        elif c == 0x7b:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
 class TheorySpider:
     """
     用于从Google Scholar爬虫导出的Excel文件中获取论文作者信息的类
     读取第二列link字符串，筛选包含thecvf.com和arxiv.org的链接，访问并解析获取作者信息
     将作者信息写入Excel文件的第四列
     """
-    def __init__(self, excel_path: str = 'google_scholar_results.xlsx'):
+    def __init__(self, excel_path: str = 'google_scholar_results.xlsx', delay: float = 3,
+                 max_connections: int = 32, use_async: bool = True, max_workers: int = 8):
         """
         初始化爬虫
         Args:
             excel_path: Excel文件路径，默认为'google_scholar_results.xlsx'
+            delay: 同一域名两次请求之间的间隔(秒)，默认为3秒
+            max_connections: 并发请求的最大连接数，默认为32
+            use_async: 是否使用异步客户端并发请求，为False时使用线程池
+            max_workers: 线程池并发请求的线程数，默认为8
         """
         self.excel_path = excel_path
+        self.delay = delay
+        self.max_connections = max_connections
+        self.use_async = use_async
+        self.max_workers = max_workers
+        # 复用连接的会话，避免每次请求重新握手
+        self.session = create_session(pool_size=16, retries=2, backoff_factor=0.5)
+        # 已请求过的URL从本地缓存读取，两种请求方式都先查缓存
+        self.cache = _PageCache(CACHE_PATH, CACHE_EXPIRE_AFTER)
         self.target_domains = ['thecvf.com', 'arxiv.org']
-        # 检查必要的依赖库是否已安装
-        self._check_dependencies()
-
-    def _check_dependencies(self):
-        """检查必要的依赖库是否已安装"""
-        try:
-            import pandas
-        except ImportError:
-            logger.error('请安装pandas库: pip install pandas')
-            raise ImportError('pandas库未安装')
-        try:
-            import bs4
-        except ImportError:
-            logger.error('请安装BeautifulSoup库: pip install beautifulsoup4')
-            raise ImportError('BeautifulSoup库未安装')
+        # 按主域名分派作者信息的解析方法，以及判断可以停止读取响应的扫描器
+        self._handlers = {
+            'arxiv.org': (self.parse_author_info, HEAD_SCANNER),
+            'thecvf.com': (self.parse_author_info, HEAD_SCANNER),
+            'ieee.org': (self.parse_author_info_ieee, IEEE_METADATA_SCANNER),
+        }
 
     def read_excel(self) -> pd.DataFrame:
         """
@@ -102,60 +257,91 @@ class TheorySpider:
         Returns:
             作者信息字符串，如果获取失败则返回空字符串
         """
-        try:
-            # 添加请求头，模拟浏览器
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'
-            }
+        content = self._get_content(url, IEEE_METADATA_SCANNER)
+        if content is None:
+            return ''
+        return self.parse_author_info_ieee(content, url)
 
+    def _get_content(self, url: str, new_scanner):
+        """
+        流式读取网页内容，满足停止条件后即停止；优先读取本地缓存
+        Args:
+            url: 网页URL
+            new_scanner: 创建停止条件扫描器的工厂
+        Returns:
+            已读取的网页内容，请求失败返回None
+        """
+        content = self.cache.get(url)
+        if content is not None:
+            return content
+
+        try:
             logger.info(f'开始访问: {url}')
-            response = requests.get(url, headers=headers, timeout=30)
+            with self.session.get(url, headers=HEADERS, timeout=30, stream=True) as response:
+                if response.status_code != 200:
+                    logger.error(f'访问失败，状态码: {response.status_code}, URL: {url}')
+                    return None
+
+                scanner = new_scanner()
+                complete = False
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if scanner.feed(chunk):
+                        complete = True
+                        break
+                content = bytes(scanner.buf)
+                # 未满足停止条件就结束的响应可能不完整，不写入缓存，下次重新请求
+                if complete:
+                    self.cache.set(url, content)
+                return content
 
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
+        except Exception as e:
+            logger.error(f'获取作者信息时发生错误: {str(e)}, URL: {url}')
+            return None
 
-                # 查找包含xplGlobal.document.metadata的脚本块
-                script_tags = soup.find_all('script')
-                metadata_script = None
-                for script in script_tags:
-                    if script.string and 'xplGlobal.document.metadata' in script.string:
-                        metadata_script = script.string
-                        break
+    def parse_author_info_ieee(self, content: bytes, url: str) -> str:
+        """
+        从IEEE页面的xplGlobal.document.metadata变量中解析作者信息
+        Args:
+            content: 网页原始内容
+            url: 网页URL，用于日志
+        Returns:
+            作者信息字符串，如果解析失败则返回空字符串
+        """
+        try:
+            # 先在原始字节中查找元数据变量，不存在则直接返回，无需解析HTML
+            idx = content.find(IEEE_METADATA_TOKEN)
+            if idx < 0:
+                logger.warning(f'未找到xplGlobal.document.metadata脚本块: {url}')
+                return ''
+
+            # 按括号层级截取完整的JSON对象，线性扫描不会回溯
+            start = idx + len(IEEE_METADATA_TOKEN)
+            end = _find_json_object_end(content, start)
+            if end < 0:
+                logger.warning(f'未找到xplGlobal.document.metadata脚本块: {url}')
+                return ''
+
+            json_str = content[start:end]
+
+            try:
+                # 解析JSON
+                metadata = orjson.loads(json_str)
 
-                if metadata_script:
-                    pattern = r'xplGlobal\.document\.metadata=({.*?});'
-                    match = re.search(pattern, metadata_script, re.DOTALL)  # re.DOTALL 让 . 匹配换行符
-
-                    if match:
-                        # 2. 提取并清理 JSON 字符串（去除可能的多余字符）
-                        json_str = match.group(1).strip()
-
-                        try:
-                            # 解析JSON
-                            metadata = json.loads(json_str)
-
-                            # 提取authors字段
-                            if 'authors' in metadata:
-                                authors = [author['name'] for author in metadata['authors']]
-                                author_str = '; '.join(authors)
-                                logger.info(f'成功获取作者信息: {author_str}')
-                                return author_str
-                            else:
-                                logger.warning(f'未在metadata中找到authors字段: {url}')
-                                return ''
-                        except json.JSONDecodeError as e:
-                            logger.error(f'解析metadata JSON时发生错误: {str(e)}, URL: {url}')
-                            return ''
-                    
+                # 提取authors字段
+                if 'authors' in metadata:
+                    authors = [author['name'] for author in metadata['authors']]
+                    author_str = '; '.join(authors)
+                    logger.info(f'成功获取作者信息: {author_str}')
+                    return author_str
                 else:
-                    logger.warning(f'未找到xplGlobal.document.metadata脚本块: {url}')
+                    logger.warning(f'未在metadata中找到authors字段: {url}')
                     return ''
-            else:
-                logger.error(f'访问失败，状态码: {response.status_code}, URL: {url}')
+            except orjson.JSONDecodeError as e:
+                logger.error(f'解析metadata JSON时发生错误: {str(e)}, URL: {url}')
                 return ''
 
         except Exception as e:
-            logger.error(f'获取作者信息时发生错误: {str(e)}, URL: {url}')
+            logger.error(f'解析作者信息时发生错误: {str(e)}, URL: {url}')
             return ''
 
     def get_author_info(self, url: str) -> str:
@@ -166,37 +352,140 @@ class TheorySpider:
         Returns:
             作者信息字符串，如果获取失败则返回空字符串
         """
-        try:
-            # 添加请求头，模拟浏览器
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'
-            }
-
-            logger.info(f'开始访问: {url}')
-            response = requests.get(url, headers=headers, timeout=30)
+        content = self._get_content(url, HEAD_SCANNER)
+        if content is None:
+            return ''
+        return self.parse_author_info(content, url)
 
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
+    def parse_author_info(self, content: bytes, url: str) -> str:
+        """
+        从网页meta标签中解析作者信息
+        Args:
+            content: 网页原始内容
+            url: 网页URL，用于日志
+        Returns:
+            作者信息字符串，如果解析失败则返回空字符串
+        """
+        try:
+            tree = lxml_html.fromstring(content)
 
-                # 查找meta标签中name=citation_author的数据
-                author_tags = soup.find_all('meta', attrs={'name': 'citation_author'})
-                authors = [tag['content'] for tag in author_tags]
+            # 查找meta标签中name=citation_author的数据
+            authors = tree.xpath('//meta[@name="citation_author"]/@content')
 
-                if authors:
-                    author_str = '; '.join(authors)
-                    logger.info(f'成功获取作者信息: {author_str}')
-                    return author_str
-                else:
-                    logger.warning(f'未找到作者信息: {url}')
-                    return ''
+            if authors:
+                author_str = '; '.join(authors)
+                logger.info(f'成功获取作者信息: {author_str}')
+                return author_str
             else:
-                logger.error(f'访问失败，状态码: {response.status_code}, URL: {url}')
+                logger.warning(f'未找到作者信息: {url}')
                 return ''
 
         except Exception as e:
-            logger.error(f'获取作者信息时发生错误: {str(e)}, URL: {url}')
+            logger.error(f'解析作者信息时发生错误: {str(e)}, URL: {url}')
             return ''
 
+    async def _fetch(self, client: httpx.AsyncClient, url: str, new_scanner,
+                     host_locks: Dict[str, asyncio.Semaphore]):
+        """
+        流式请求单个URL，同一域名串行并保持请求间隔，不同域名之间并发
+        Args:
+            client: 异步HTTP客户端
+            url: 网页URL
+            new_scanner: 创建停止条件扫描器的工厂
+            host_locks: 按域名区分的信号量
+        Returns:
+            已读取的网页内容，请求失败返回None
+        """
+        # 本地缓存命中时不会访问网络，无需排队等待
+        content = self.cache.get(url)
+        if content is not None:
+            return content
+
+        host = urlsplit(url).netloc
+        lock = host_locks.setdefault(host, asyncio.Semaphore(1))
+        async with lock:
+            try:
+                logger.info(f'开始访问: {url}')
+                async with client.stream('GET', url) as response:
+                    if response.status_code != 200:
+                        logger.error(f'访问失败，状态码: {response.status_code}, URL: {url}')
+                        return None
+
+                    scanner = new_scanner()
+                    complete = False
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        if scanner.feed(chunk):
+                            complete = True
+                            break
+                    content = bytes(scanner.buf)
+                    # 未满足停止条件就结束的响应可能不完整，不写入缓存，下次重新请求
+                    if complete:
+                        self.cache.set(url, content)
+                    return content
+            except Exception as e:
+                logger.error(f'获取作者信息时发生错误: {str(e)}, URL: {url}')
+                return None
+            finally:
+                # 添加延迟，避免对同一域名请求过快
+                await asyncio.sleep(self.delay)
+
+    async def _fetch_all(self, targets: List[tuple]) -> list:
+        """
+        并发请求所有URL
+        Args:
+            targets: (网页URL, 停止条件扫描器的工厂) 列表
+        Returns:
+            与targets顺序一致的网页内容列表
+        """
+        host_locks = {}
+        limits = httpx.Limits(max_connections=self.max_connections)
+        async with httpx.AsyncClient(http2=True, limits=limits, headers=HEADERS,
+                                     timeout=30, follow_redirects=True) as client:
+            return await asyncio.gather(*(self._fetch(client, url, new_scanner, host_locks)
+                                          for url, new_scanner in targets))
+
+    def _fetch_throttled(self, url: str, new_scanner,
+                         host_locks: Dict[str, threading.Semaphore]):
+        """
+        线程池中请求单个URL，同一域名串行并保持请求间隔，已缓存的URL直接读取
+        Args:
+            url: 网页URL
+            new_scanner: 创建停止条件扫描器的工厂
+            host_locks: 按域名区分的信号量
+        Returns:
+            已读取的网页内容，请求失败返回None
+        """
+        # 本地缓存命中时不会访问网络，无需排队等待
+        content = self.cache.get(url)
+        if content is not None:
+            return content
+
+        host = urlsplit(url).netloc
+        lock = host_locks.setdefault(host, threading.Semaphore(1))
+        with lock:
+            try:
+                return self._get_content(url, new_scanner)
+            finally:
+                # 添加延迟，避免对同一域名请求过快
+                time.sleep(self.delay)
+
+    def _fetch_all_threaded(self, targets: List[tuple]) -> list:
+        """
+        使用线程池并发请求所有URL
+        Args:
+            targets: (网页URL, 停止条件扫描器的工厂) 列表
+        Returns:
+            与targets顺序一致的网页内容列表
+        """
+        host_locks = {}
+        contents = [None] * len(targets)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._fetch_throttled, url, new_scanner, host_locks): i
+                       for i, (url, new_scanner) in enumerate(targets)}
+            for future in as_completed(futures):
+                contents[futures[future]] = future.result()
+        return contents
+
     def process_links(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         处理筛选后的链接，获取作者信息并添加到DataFrame中
@@ -210,43 +499,53 @@ class TheorySpider:
         #     df.insert(len(df.columns), f'col_{len(df.columns)}', '')
         #     logger.info(f'添加空列至DataFrame，当前列数: {len(df.columns)}')
 
-        # 遍历筛选后的记录
-        for index, row in df.iterrows():
-            logger.info(f'正在处理第 {index+1}/{len(df)} 条记录')
-            # 获取第二列的链接
-            second_column_name = df.columns[1]
-            url = row[second_column_name]
+        # 下载判断公式列整列一次生成，保存到第五列（索引为4）
+        df['has_download'] = '=IF(ISNUMBER(SEARCH("arxiv", B' + (df.index + 2).astype(str) + ')), "是", "否")'
+
+        # 作者信息先收集到按行位置对齐的列表中，最后整列写回
+        if 'authors' in df.columns:
+            authors_out = df['authors'].tolist()
+        else:
+            authors_out = [''] * len(df)
 
-            # 保存作者信息到第五列（索引为4）
-            df.loc[index, 'has_download'] = f'=IF(ISNUMBER(SEARCH("arxiv", B{index+2})), "是", "否")'
+        # 获取第二列的链接
+        second_column_name = df.columns[1]
 
-            if not url: continue
+        # 遍历筛选后的记录，收集需要访问的链接
+        tasks = []
+        for i, url in enumerate(df[second_column_name]):
+            logger.info(f'正在处理第 {i+1}/{len(df)} 条记录')
 
-            # 如果是 .pdf后缀跳过
-            if url.endswith('.pdf'): continue
+            if not isinstance(url, str) or not url: continue
 
-            authors = ''
+            parts = urlsplit(url)
 
-            # 判断 url 是否包含 arxiv.org 或 thecvf.com
-            if "arxiv.org" in url or "thecvf.com" in url:
-                # 获取作者信息
-                authors = self.get_author_info(url)
-            elif "ieee.org" in url:
-                authors = self.get_author_info_ieee(url)
-            else:
+            # 如果是 .pdf后缀跳过
+            if parts.path.endswith('.pdf'): continue
+
+            # 取主域名（如 arxiv.org、thecvf.com、ieee.org）查找对应的解析方法；hostname 已去掉端口和用户信息并转为小写
+            domain = '.'.join((parts.hostname or '').rsplit('.', 2)[-2:])
+            handler = self._handlers.get(domain)
+            if handler is None:
                 logger.warning(f'未找到作者信息: {url}')
                 continue
 
+            parser, new_scanner = handler
+            tasks.append((i, url, parser, new_scanner))
 
+        # 并发请求所有链接
+        targets = [(url, new_scanner) for _, url, _, new_scanner in tasks]
+        if self.use_async:
+            contents = asyncio.run(self._fetch_all(targets))
+        else:
+            contents = self._fetch_all_threaded(targets)
 
-            # 保存作者信息到第四列（索引为3）
-            # df['D'] = authors
-            df.loc[index, 'authors'] = authors
-
-
+        for (i, url, parser, _), content in zip(tasks, contents):
+            # 获取作者信息
+            authors_out[i] = parser(content, url) if content is not None else ''
 
-            # 添加延迟，避免请求过快
-            time.sleep(3)
+        # 保存作者信息到第四列（索引为3）
+        df['authors'] = authors_out
 
         return df
 
@@ -259,8 +558,9 @@ class TheorySpider:
             保存成功返回True，否则返回False
         """
         try:
-            # 直接覆盖原文件
-            df.to_excel(self.excel_path, index=False)
+            # 直接覆盖原文件，xlsxwriter 逐行写出
+            with pd.ExcelWriter(self.excel_path, engine='xlsxwriter') as writer:
+                df.to_excel(writer, index=False)
             logger.info(f'结果已保存到原文件: {self.excel_path}')
             return True
 
@@ -1,8 +1,47 @@
 from pxr import Usd, UsdGeom, UsdPhysics, Gf, UsdShade, Sdf
 import xml.etree.ElementTree as ET
+import bisect
+import copy
+import io
+import logging
+import math
 import os
+from pathlib import Path
 import numpy as np
-from xml.dom import minidom
+from utils.usd_mtl import (
+    TextureExport,
+    copy_textures,
+    find_texture_files,
+    write_material_file,
+)
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+logger = logging.getLogger(__name__)
+
+
+# USD关节schema类型名称 -> URDF关节类型
+_JOINT_TYPE_MAP = {
+    "PhysicsRevoluteJoint": "revolute",
+    "PhysicsPrismaticJoint": "prismatic",
+    "PhysicsSphericalJoint": "spherical",
+    "PhysicsFixedJoint": "fixed",
+}
+
+# 类型名 -> 是否为关节，预置已知的关节类型，其他类型名在 _is_joint 中判断后加入
+_JOINT_TYPE_NAMES = dict.fromkeys(_JOINT_TYPE_MAP, True)
+
+# 带限制信息的关节类型 -> 对应的schema
+_JOINT_LIMIT_SCHEMAS = {
+    "revolute": UsdPhysics.RevoluteJoint,
+    "prismatic": UsdPhysics.PrismaticJoint,
+}
+
+# 可以作为Link的几何类型
+_GEOM_TYPES = frozenset(("Mesh", "Cylinder", "Sphere", "Cone"))
 
 
 class UsdToUrdfConverter:
@@ -10,8 +49,12 @@ class UsdToUrdfConverter:
         self.urdf_root = ET.Element("robot")
         self.link_id_counter = 0
         self.joint_id_counter = 0
-        self.transform_stack = []
         self.visited_links = set()
+        # origin 平移的缩放系数
+        self.scale = 1.0
+        # 待生成origin的 (父节点, 变换矩阵)，遍历结束后批量计算
+        self._pending_origins = []
+        self.stage = None
 
     def convert(self, usd_file_path, output_file_path):
         """主转换函数：解析USD并生成URDF"""
@@ -22,7 +65,7 @@ class UsdToUrdfConverter:
             links, joints, stage = self.parse_usd_file(usd_file_path)
 
             # 导出网格
-            self.export_meshes(stage, links, output_file_path)
+            self.export_meshes(stage, links, meshes_dir, materials_dir, textures_dir)
 
             # 创建URDF结构
             urdf_path = self.create_urdf_structure(links, joints, output_file_path)
@@ -45,7 +88,8 @@ class UsdToUrdfConverter:
         links = {}
         joints = []
 
-        # 遍历所有primitives
+        # 只遍历一次所有primitives，网格直接处理，关节先收集，待所有链接确定后再生成
+        joint_prims = []
         for prim in stage.TraverseAll():
             if prim.IsA(UsdGeom.Mesh):
                 link_name = prim.GetName()
@@ -54,8 +98,7 @@ class UsdToUrdfConverter:
                 siblings = prim.GetParent().GetAllChildren()
 
                 # 获取mesh路径和变换
-                mesh_prim = UsdGeom.Mesh(prim)
-                mesh_path = str(mesh_prim.GetPrim().GetPath())  # 修正此处
+                mesh_path = prim.GetPath().pathString
 
                 # 获取变换矩阵
                 xform = UsdGeom.Xformable(prim)
@@ -71,7 +114,7 @@ class UsdToUrdfConverter:
 
                 print(f"  XformOp数量: {len(xform_ops)}")
 
-                links[link_name] = {
+                link_data = links[link_name] = {
                     "mesh_path": mesh_path,
                     # "translation": translation,
                     # "scale": scale,
@@ -86,7 +129,7 @@ class UsdToUrdfConverter:
 
                     op_value = op.Get()
 
-                    links[link_name][op_name] = op_value
+                    link_data[op_name] = op_value
                     print(f"  XformOp #{i+1}:")
                     print(f"    类型: {_get_op_type_name(op_type)} ({op_type})")
                     print(f"    名称: {op_name}")
@@ -106,77 +149,95 @@ class UsdToUrdfConverter:
                     else:
                         print("  碰撞体信息: 无详细信息")
 
-        # 遍历所有primitives
-        for prim in stage.Traverse():
-            if _is_joint(prim):
-                joint_info = self._extract_joint_info(prim)
-                if not joint_info:
-                    return
-                joint_name = prim.GetName()
-
-                # 从遍历过程中收集的joint信息创建关节数据
-                # 注意：在实际应用中，这些信息应该直接在_traverse_prim中收集
-                # 这里只是为了保持与现有代码结构兼容
-                for i, (parent_link, child_link) in enumerate(
-                    zip(links.keys(), list(links.keys())[1:])
-                ):
-                    joints.append(
-                        {
-                            "name": joint_name,
-                            "type": "fixed",
-                            "parent": parent_link,
-                            "child": child_link,
-                            "origin_xyz": [0, 0, 0],
-                            "origin_rpy": [0, 0, 0],
-                        }
-                    )
+            # 关节只取 stage.Traverse() 会访问到的prim（激活、已加载、已定义且非抽象）
+            elif (
+                prim.IsActive()
+                and prim.IsLoaded()
+                and prim.IsDefined()
+                and not prim.IsAbstract()
+                and _is_joint(prim)
+            ):
+                joint_prims.append(prim)
+
+        # 按mesh路径排序，便于由刚体路径查找所属链接
+        link_paths = sorted(
+            (link_data["mesh_path"], link_name) for link_name, link_data in links.items()
+        )
 
-        return links, joints, stage
+        # 每个USD关节只生成一条关节数据，父子链接取自body0/body1关系
+        for prim in joint_prims:
+            joint_info = self._extract_joint_info(prim)
+            if not joint_info:
+                return
+            joint_name = prim.GetName()
+
+            joint = UsdPhysics.Joint(prim)
+            parent_link = _get_body_link(joint.GetBody0Rel(), link_paths)
+            child_link = _get_body_link(joint.GetBody1Rel(), link_paths)
+            if not parent_link or not child_link:
+                print(f"  警告: 关节 {joint_name} 未找到对应的父子链接，跳过")
+                continue
 
-    def export_meshes(self, stage, links, output_dir):
-        """导出USD中的网格为OBJ格式"""
-        # 创建meshes目录
-        meshes_dir = os.path.join(output_dir, "meshes")
-        os.makedirs(meshes_dir, exist_ok=True)
+            joints.append(
+                {
+                    "name": joint_name,
+                    "type": "fixed",
+                    "parent": parent_link,
+                    "child": child_link,
+                    "origin_xyz": [0, 0, 0],
+                    "origin_rpy": [0, 0, 0],
+                }
+            )
 
-        # 创建materials目录
-        materials_dir = os.path.join(output_dir, "materials")
-        os.makedirs(materials_dir, exist_ok=True)
+        return links, joints, stage
 
-        # 创建textures目录
-        textures_dir = os.path.join(output_dir, "textures")
-        os.makedirs(textures_dir, exist_ok=True)
+    def export_meshes(self, stage, links, meshes_dir, materials_dir, textures_dir):
+        """导出USD中的网格为OBJ格式，输出目录由 _create_mkdir 创建"""
+        # 材质路径 -> 纹理文件，多个网格共用同一材质时只遍历一次着色器网络
+        texture_cache = {}
+        # 本次导出的纹理登记状态（只读取一次textures目录），网格导出完成后一起并行复制
+        textures = TextureExport.for_dir(textures_dir)
+        # 输出目录前缀（带路径分隔符），循环内只需拼接文件名，不再逐个调用 os.path.join
+        meshes_prefix = os.path.join(meshes_dir, "")
+        materials_prefix = os.path.join(materials_dir, "")
 
         # 为每个网格创建OBJ文件
         for link_name, link_data in links.items():
             mesh_prim = stage.GetPrimAtPath(Sdf.Path(link_data["mesh_path"]))
             if not mesh_prim or not mesh_prim.IsA(UsdGeom.Mesh):
-                print(f"警告: {link_data['mesh_path']} 不是有效的网格，跳过导出")
+                logger.warning(f"{link_data['mesh_path']} 不是有效的网格，跳过导出")
                 continue
 
-            obj_path = os.path.join(meshes_dir, f"{link_name}.obj")
-            mtl_path = os.path.join(materials_dir, f"{link_name}.mtl")
+            obj_path = meshes_prefix + link_name + ".obj"
+            mtl_path = materials_prefix + link_name + ".mtl"
 
             try:
                 mesh = UsdGeom.Mesh(mesh_prim)
 
-                # 获取顶点数据
-                points = mesh.GetPointsAttr().Get()
-                if not points:
-                    print(f"警告: 网格 {link_name} 没有顶点数据，跳过导出")
+                # 获取顶点数据，VtArray 通过缓冲区协议直接转换为 NumPy 数组
+                points = _vt_to_numpy(mesh.GetPointsAttr().Get(), np.float32, 3)
+                if not len(points):
+                    logger.warning(f"网格 {link_name} 没有顶点数据，跳过导出")
                     continue
 
                 # 获取法线数据
-                normals = mesh.GetNormalsAttr().Get()
+                normals = _vt_to_numpy(mesh.GetNormalsAttr().Get(), np.float32, 3)
 
-                # 获取纹理坐标
-                tex_coords = None
-                if mesh.GetPrim().HasAttribute("st"):
-                    tex_coords = mesh.GetPrim().GetAttribute("st").Get()
+                # 获取纹理坐标，属性只查找一次
+                st_attr = mesh_prim.GetAttribute("st")
+                tex_coords = _vt_to_numpy(
+                    st_attr.Get() if st_attr else None, np.float32, 2
+                )
 
                 # 获取面索引
-                face_vertex_counts = mesh.GetFaceVertexCountsAttr().Get()
-                face_vertex_indices = mesh.GetFaceVertexIndicesAttr().Get()
+                face_vertex_counts = _vt_to_numpy(
+                    mesh.GetFaceVertexCountsAttr().Get(), np.int32
+                )
+                # OBJ索引从1开始，整个数组一次加1，不再逐个索引计算
+                face_vertex_indices = _vt_to_numpy(
+                    mesh.GetFaceVertexIndicesAttr().Get(), np.int32
+                )
+                obj_vertex_indices = np.add(face_vertex_indices, 1, dtype=np.int32)
 
                 # 尝试获取材质绑定
                 material_binding = UsdShade.MaterialBindingAPI(mesh_prim)
@@ -190,177 +251,165 @@ class UsdToUrdfConverter:
                     material_name = material.GetPrim().GetName()
 
                     # 尝试提取材质信息和贴图
-                    write_material_file(material, mtl_path, textures_dir, stage)
-
-                # 写入OBJ文件
-                with open(obj_path, "w") as f:
-                    # 写入文件头
-                    f.write(f"# OBJ file exported from USD\n")
-                    f.write(f"# Mesh: {link_name}\n")
-
-                    # 如果有材质，引用材质文件
-                    if material_name:
-                        f.write(f"mtllib ../materials/{link_name}.mtl\n")
-
-                    # 写入顶点
-                    for point in points:
-                        f.write(f"v {point[0]} {point[1]} {point[2]}\n")
-
-                    # 写入法线
-                    if normals:
-                        for normal in normals:
-                            f.write(f"vn {normal[0]} {normal[1]} {normal[2]}\n")
-
-                    # 写入纹理坐标
-                    if tex_coords:
-                        for coord in tex_coords:
-                            f.write(f"vt {coord[0]} {coord[1]}\n")
-
-                    # 写入面
-                    current_vertex_index = 0
-                    for i, count in enumerate(face_vertex_counts):
-                        indices = face_vertex_indices[
-                            current_vertex_index : current_vertex_index + count
-                        ]
-
-                        # 写入材质组（如果有）
-                        if material_name and i == 0:
-                            f.write(f"usemtl {material_name}\n")
-
-                        # 构建面的索引字符串
-                        face_str = "f"
-                        for idx in indices:
-                            vertex_idx = idx + 1  # OBJ索引从1开始
-
-                            if tex_coords and normals:
-                                face_str += f" {vertex_idx}/{vertex_idx}/{vertex_idx}"
-                            elif tex_coords:
-                                face_str += f" {vertex_idx}/{vertex_idx}"
-                            elif normals:
-                                face_str += f" {vertex_idx}//{vertex_idx}"
-                            else:
-                                face_str += f" {vertex_idx}"
-
-                        f.write(f"{face_str}\n")
-                        current_vertex_index += count
-
-                print(f"成功导出网格 {link_name} 到 {obj_path}")
+                    material_path = material.GetPath()
+                    texture_files = texture_cache.get(material_path)
+                    if texture_files is None:
+                        texture_files = texture_cache[material_path] = find_texture_files(
+                            material, stage
+                        )
+                    write_material_file(
+                        material,
+                        mtl_path,
+                        textures_dir,
+                        stage,
+                        texture_files,
+                        textures,
+                    )
+
+                # 先在内存中拼好整个OBJ内容，最后一次写入文件；
+                # 缓冲区按顶点和面数一次分配，格式化结果按偏移写入，避免反复扩容和最后的拼接
+                out = _PresizedBuffer(
+                    _estimate_obj_size(
+                        points, normals, tex_coords, face_vertex_counts, obj_vertex_indices
+                    )
+                )
+                out.write(b"# OBJ file exported from USD\n")
+                out.write(f"# Mesh: {link_name}\n".encode("utf-8"))
+
+                # 如果有材质，引用材质文件
+                if material_name:
+                    out.write(f"mtllib ../materials/{link_name}.mtl\n".encode("utf-8"))
+
+                # 顶点，%.9g 可以无损表示 float32
+                np.savetxt(out, points, fmt="v %.9g %.9g %.9g")
+
+                # 法线
+                if len(normals):
+                    np.savetxt(out, normals, fmt="vn %.9g %.9g %.9g")
+
+                # 纹理坐标
+                if len(tex_coords):
+                    np.savetxt(out, tex_coords, fmt="vt %.9g %.9g")
+
+                # 材质组（如果有）
+                if material_name and len(face_vertex_counts):
+                    out.write(f"usemtl {material_name}\n".encode("utf-8"))
+
+                # 面
+                out.write(
+                    _format_faces(
+                        face_vertex_counts,
+                        obj_vertex_indices,
+                        len(tex_coords) > 0,
+                        len(normals) > 0,
+                    )
+                )
+
+                # 写入OBJ文件，只写出实际使用的部分
+                with out.getbuffer() as view:
+                    _write_bytes(obj_path, view)
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"成功导出网格 {link_name} 到 {obj_path}")
 
             except Exception as e:
-                print(f"导出网格 {link_name} 失败: {e}")
+                logger.error(f"导出网格 {link_name} 失败: {e}")
+
+        # 所有网格导出完成后，并行复制收集到的纹理
+        copy_textures(textures)
 
+    @staticmethod
     def create_urdf_structure(links, joints, output_dir):
         """创建URDF文件结构"""
+        # 用 TreeBuilder 顺序生成节点，省去 SubElement 逐个解析关键字参数
+        tb = ET.TreeBuilder()
+
         # 创建根元素
-        robot = ET.Element("robot", name="generated_robot")
+        tb.start("robot", {"name": "generated_robot"})
 
         # 添加links
         for link_name, link_data in links.items():
-            link = ET.SubElement(robot, "link", name=link_name)
-
-            # 添加视觉元素
-            visual = ET.SubElement(link, "visual")
-            origin = ET.SubElement(
-                visual,
-                "origin",
-                xyz=f"{link_data['translation'][0]} {link_data['translation'][1]} {link_data['translation'][2]}",
-                rpy="0 0 0",
-            )  # 简化的旋转表示
-            geometry = ET.SubElement(visual, "geometry")
+            tb.start("link", {"name": link_name})
+
+            # 添加视觉元素，平移取自 xformOp:translate
+            tx, ty, tz = link_data.get("xformOp:translate") or (0, 0, 0)
+            tb.start("visual", {})
+            _add_leaf(tb, "origin", {"xyz": f"{tx} {ty} {tz}", "rpy": "0 0 0"})  # 简化的旋转表示
 
             # 创建相对于模型文件夹的mesh路径
-            mesh_file = f"meshes/{link_name}.obj"
-            mesh = ET.SubElement(geometry, "mesh", filename=mesh_file)
+            tb.start("geometry", {})
+            _add_leaf(tb, "mesh", {"filename": f"meshes/{link_name}.obj"})
+            tb.end("geometry")
 
             # 添加材质（如果有）
             if "material" in link_data:
-                material = ET.SubElement(visual, "material", name=link_data["material"])
-                color = ET.SubElement(material, "color", rgba="1 1 1 1")  # 默认白色
+                tb.start("material", {"name": link_data["material"]})
+                _add_leaf(tb, "color", {"rgba": "1 1 1 1"})  # 默认白色
+                tb.end("material")
+
+            tb.end("visual")
+            tb.end("link")
 
         # 添加joints
         for joint in joints:
-            joint_element = ET.SubElement(
-                robot, "joint", name=joint["name"], type=joint["type"]
-            )
-            origin = ET.SubElement(
-                joint_element,
-                "origin",
-                xyz=f"{joint['origin_xyz'][0]} {joint['origin_xyz'][1]} {joint['origin_xyz'][2]}",
-                rpy=f"{joint['origin_rpy'][0]} {joint['origin_rpy'][1]} {joint['origin_rpy'][2]}",
-            )
-            parent = ET.SubElement(joint_element, "parent", link=joint["parent"])
-            child = ET.SubElement(joint_element, "child", link=joint["child"])
+            tb.start("joint", {"name": joint["name"], "type": joint["type"]})
+            ox, oy, oz = joint["origin_xyz"]
+            rr, rp, ry = joint["origin_rpy"]
+            _add_leaf(tb, "origin", {"xyz": f"{ox} {oy} {oz}", "rpy": f"{rr} {rp} {ry}"})
+            _add_leaf(tb, "parent", {"link": joint["parent"]})
+            _add_leaf(tb, "child", {"link": joint["child"]})
 
             if joint["type"] != "fixed":
-                axis = ET.SubElement(joint_element, "axis", xyz="0 0 1")  # 默认绕Z轴
-                limit = ET.SubElement(
-                    joint_element,
+                _add_leaf(tb, "axis", {"xyz": "0 0 1"})  # 默认绕Z轴
+                _add_leaf(
+                    tb,
                     "limit",
-                    effort="100",
-                    velocity="1",
-                    lower=str(joint.get("lower", 0)),
-                    upper=str(joint.get("upper", 0)),
+                    {
+                        "effort": "100",
+                        "velocity": "1",
+                        "lower": str(joint.get("lower", 0)),
+                        "upper": str(joint.get("upper", 0)),
+                    },
                 )
+            tb.end("joint")
+
+        tb.end("robot")
+        robot = tb.close()
 
-        # 美化XML输出
-        xml_str = minidom.parseString(ET.tostring(robot)).toprettyxml(indent="  ")
+        # 原地缩进美化XML，无需再解析一遍
+        ET.indent(robot, space="  ")
 
         # 保存URDF文件
         urdf_path = os.path.join(output_dir, "robot.urdf")
-        with open(urdf_path, "w") as f:
-            f.write(xml_str)
+        ET.ElementTree(robot).write(urdf_path, xml_declaration=True, encoding="utf-8")
 
         return urdf_path
 
     def _create_mkdir(self, output_dir):
-        """创建文件夹"""
-        # 创建meshes目录
-        meshes_dir = os.path.join(output_dir, "meshes")
-        os.makedirs(meshes_dir, exist_ok=True)
-
-        # 创建materials目录
-        materials_dir = os.path.join(output_dir, "materials")
-        os.makedirs(materials_dir, exist_ok=True)
-
-        # 创建textures目录
-        textures_dir = os.path.join(output_dir, "textures")
-        os.makedirs(textures_dir, exist_ok=True)
-
-        return meshes_dir, materials_dir, textures_dir
+        """创建 meshes、materials、textures 文件夹"""
+        output_dir = Path(output_dir)
+        dirs = tuple(output_dir / name for name in ("meshes", "materials", "textures"))
+        for path in dirs:
+            path.mkdir(parents=True, exist_ok=True)
+        return dirs
 
     def _get_joint_limit_info(self, joint):
-        """获取关节的限制信息"""
+        """获取关节的限制信息，joint 为 RevoluteJoint 或 PrismaticJoint schema"""
         limit_info = {}
 
-        # 获取旋转关节的限制
-        if isinstance(joint, UsdPhysics.RevoluteJoint):
-            lower_limit_attr = joint.GetLowerLimitAttr()
-            upper_limit_attr = joint.GetUpperLimitAttr()
-
-            if lower_limit_attr and upper_limit_attr:
-                lower_limit = lower_limit_attr.Get()
-                upper_limit = upper_limit_attr.Get()
-                if lower_limit is not None and upper_limit is not None:
-                    limit_info["lower"] = lower_limit
-                    limit_info["upper"] = upper_limit
-                    # 设置默认的effort和velocity
-                    limit_info["effort"] = 100.0
-                    limit_info["velocity"] = 1.0
-
-        # 获取棱柱关节的限制
-        elif isinstance(joint, UsdPhysics.PrismaticJoint):
-            lower_limit_attr = joint.GetLowerLimitAttr()
-            upper_limit_attr = joint.GetUpperLimitAttr()
-
-            if lower_limit_attr and upper_limit_attr:
-                lower_limit = lower_limit_attr.Get()
-                upper_limit = upper_limit_attr.Get()
-                if lower_limit is not None and upper_limit is not None:
-                    limit_info["lower"] = lower_limit
-                    limit_info["upper"] = upper_limit
-                    # 设置默认的effort和velocity
-                    limit_info["effort"] = 100.0
-                    limit_info["velocity"] = 1.0
+        # 旋转关节和棱柱关节的限制属性相同
+        lower_limit_attr = joint.GetLowerLimitAttr()
+        upper_limit_attr = joint.GetUpperLimitAttr()
+
+        if lower_limit_attr and upper_limit_attr:
+            lower_limit = lower_limit_attr.Get()
+            upper_limit = upper_limit_attr.Get()
+            if lower_limit is not None and upper_limit is not None:
+                limit_info["lower"] = lower_limit
+                limit_info["upper"] = upper_limit
+                # 设置默认的effort和velocity
+                limit_info["effort"] = 100.0
+                limit_info["velocity"] = 1.0
 
         return limit_info if limit_info else None
 
@@ -386,20 +435,9 @@ class UsdToUrdfConverter:
 
     def _get_joint_type(self, joint):
         """确定关节类型"""
-        # 检查是否为特定类型的关节
-        if UsdPhysics.RevoluteJoint(joint):
-            return "revolute"
-        elif UsdPhysics.PrismaticJoint(joint):
-            return "prismatic"
-        elif UsdPhysics.SphericalJoint(joint):
-            return "spherical"
-        elif UsdPhysics.FixedJoint(joint):
-            return "fixed"
-        elif UsdPhysics.D6Joint(joint):
-            # D6关节比较复杂，可以根据配置映射到不同的URDF类型
-            return "continuous"  # 默认作为continuous处理，可根据需要调整
-        else:
-            return "fixed"  # 默认作为fixed处理
+        # 按schema类型名称查表，无需逐个构造关节schema；未知类型默认作为fixed处理
+        return _JOINT_TYPE_MAP.get(joint.GetPrim().GetTypeName(), "fixed")
+
     def _get_origin_transform(self, prim):
             """获取prim的变换信息作为origin"""
             xformable = UsdGeom.Xformable(prim)
@@ -407,7 +445,7 @@ class UsdToUrdfConverter:
                 return None
                 
             # 获取局部变换矩阵
-            transform = xformable.ComputeLocalToWorldTransform(Usd.TimeCode.Default())
+            transform = xformable.GetLocalTransformation(Usd.TimeCode.Default())
             
             # 提取平移
             translation = Gf.GetTranslates(transform)[0]
@@ -416,7 +454,7 @@ class UsdToUrdfConverter:
             # 提取旋转（转换为RPY）
             rotation = Gf.Rotation(transform.ExtractRotationMatrix())
             quat = rotation.GetQuat()
-            rpy = self._quat_to_rpy(quat)
+            rpy = self._quaternion_to_rpy(quat)
             
             return {"xyz": xyz, "rpy": rpy}
     def _extract_joint_info(self, prim):
@@ -435,76 +473,87 @@ class UsdToUrdfConverter:
             "limit": None,
         }
 
-        # 获取关节轴
-        axis_attr = joint.GetAxisAttr()
-        if axis_attr:
-            joint_info["axis"] = axis_attr.Get()
+        # 获取关节轴和关节限制（如果是revolute或prismatic关节），确定类型后只构造对应的schema
+        limit_schema = _JOINT_LIMIT_SCHEMAS.get(joint_info["type"])
+        if limit_schema is not None:
+            typed_joint = limit_schema(prim)
 
-        # 获取关节限制（如果是revolute或prismatic关节）
-        if joint_info["type"] in ["revolute", "prismatic"]:
-            limit_info = self._get_joint_limit_info(joint)
+            axis_attr = typed_joint.GetAxisAttr()
+            if axis_attr:
+                joint_info["axis"] = axis_attr.Get()
+
+            limit_info = self._get_joint_limit_info(typed_joint)
             if limit_info:
                 joint_info["limit"] = limit_info
 
         return joint_info
 
-    def _traverse_prim(self, prim, parent_link, is_root=False):
-        """递归遍历USD Prim，构建URDF结构"""
-        prim_path = prim.GetPath().pathString
-
-        # 跳过已处理的Link
-        if prim_path in self.visited_links:
-            return
-
-        self.visited_links.add(prim_path)
+    def traverse_stage(self, stage):
+        """从伪根节点遍历整个stage构建URDF树，返回robot根节点"""
+        self.stage = stage
+        self._traverse_prim(stage.GetPseudoRoot(), None, is_root=True)
+        self._flush_origins()
+        return self.urdf_root
 
-        # 获取当前Prim的变换矩阵（累积父级变换）
-        xformable = UsdGeom.Xformable(prim)
+    def _traverse_prim(self, prim, parent_link, is_root=False):
+        """用显式栈遍历USD Prim（深度优先、保持子节点顺序），构建URDF结构"""
         time_code = Usd.TimeCode.Default()  # 使用默认时间码（通常是0）
-        local_transform = xformable.ComputeLocalToWorldTransform(time_code)
-        if self.transform_stack:
-            parent_transform = self.transform_stack[-1]
-            local_transform = parent_transform * local_transform
-
-        # 处理伪根节点（特殊情况）
-        if prim.IsPseudoRoot():
-            # 伪根节点没有类型名称，直接遍历其子节点
-            self.transform_stack.append(local_transform)
-            for child_prim in prim.GetChildren():
-                self._traverse_prim(child_prim, parent_link, is_root=False)
-            self.transform_stack.pop()
-            return
 
-        # 处理Xform类型（变换层级）
-        if prim.GetTypeName() == "Xform":
-            self.transform_stack.append(local_transform)
-            for child_prim in prim.GetChildren():
-                self._traverse_prim(child_prim, parent_link, is_root=False)
-            self.transform_stack.pop()
-            return
+        # 栈元素：(prim, 父Link, 是否根节点, 父级世界变换)
+        stack = [(prim, parent_link, is_root, None)]
+        while stack:
+            prim, parent_link, is_root, parent_transform = stack.pop()
+            prim_path = prim.GetPath().pathString
 
-        # 处理Link（几何实体）
-        if self._is_geometric_prim(prim):
-            link_name = self._generate_link_name(prim_path)
-            link = self._create_link(link_name, prim, local_transform)
+            # 跳过已处理的Link
+            if prim_path in self.visited_links:
+                continue
 
-            # 创建Joint（非根节点时）
-            if not is_root and parent_link:
-                joint_name = self._generate_joint_name(prim_path)
-                self._create_joint(joint_name, parent_link, link, local_transform)
+            self.visited_links.add(prim_path)
 
-            # 继续遍历子节点
-            for child_prim in prim.GetChildren():
-                self._traverse_prim(child_prim, link, is_root=False)
+            # 获取当前Prim的变换矩阵（累积父级变换）
+            # 只取自身的局部变换，再与父级世界变换组合，避免每个prim都向上遍历到根节点
+            xformable = UsdGeom.Xformable(prim)
+            if xformable:
+                local_transform = xformable.GetLocalTransformation(time_code)
+            else:
+                local_transform = Gf.Matrix4d(1.0)
+            if parent_transform is not None:
+                # Gf 使用行向量，子级世界变换 = 局部变换 * 父级世界变换
+                local_transform = local_transform * parent_transform
+
+            # 类型名称只读取一次，后续判断都使用它
+            type_name = prim.GetTypeName()
+
+            # 处理伪根节点（特殊情况）和Xform类型（变换层级）：
+            # 伪根节点没有类型名称，二者都直接遍历子节点，并向下传递当前变换
+            if type_name == "Xform" or prim.IsPseudoRoot():
+                child_link, child_transform = parent_link, local_transform
+
+            # 处理Link（几何实体）
+            elif type_name in _GEOM_TYPES:
+                link_name = self._generate_link_name(prim_path)
+                link = self._create_link(link_name, prim, local_transform, type_name)
+
+                # 创建Joint（非根节点时）
+                if not is_root and parent_link:
+                    joint_name = self._generate_joint_name(prim_path)
+                    self._create_joint(joint_name, parent_link, link, local_transform)
+
+                # 几何实体不改变子节点继承的变换
+                child_link, child_transform = link, parent_transform
+
+            else:
+                continue
+
+            # 子节点逆序入栈，出栈时保持原有顺序
+            for child_prim in reversed(prim.GetChildren()):
+                stack.append((child_prim, child_link, False, child_transform))
 
     def _is_geometric_prim(self, prim):
         """判断Prim是否为几何实体（可作为Link）"""
-        return (
-            prim.IsA(UsdGeom.Mesh)
-            or prim.IsA(UsdGeom.Cylinder)
-            or prim.IsA(UsdGeom.Sphere)
-            or prim.IsA(UsdGeom.Cone)
-        )
+        # 按类型名称查集合，避免逐个 IsA 做schema查找
+        return prim.GetTypeName() in _GEOM_TYPES
 
     def _generate_link_name(self, prim_path):
         """生成唯一的Link名称"""
@@ -522,56 +571,51 @@ class UsdToUrdfConverter:
             self.joint_id_counter += 1
         return base_name
 
-    def _create_link(self, link_name, prim, transform):
+    def _create_link(self, link_name, prim, transform, type_name=None):
         """创建URDF Link节点，包含几何和惯性信息"""
+        if type_name is None:
+            type_name = prim.GetTypeName()
+
         link = ET.SubElement(self.urdf_root, "link", name=link_name)
 
-        # 转换变换矩阵为URDF的origin
-        origin = self._transform_to_origin(transform)
-        if origin:
-            link.append(origin)
+        # 转换变换矩阵为URDF的origin，遍历结束后统一计算
+        self._pending_origins.append((link, transform))
 
         # 添加几何信息
         visual = ET.SubElement(link, "visual")
-        visual.append(ET.SubElement(visual, "origin"))
+        ET.SubElement(visual, "origin")
         geometry = ET.SubElement(visual, "geometry")
 
-        if prim.IsA(UsdGeom.Mesh):
+        if type_name == "Mesh":
             self._add_mesh_geometry(geometry, prim)
-        elif prim.IsA(UsdGeom.Cylinder):
+        elif type_name == "Cylinder":
             self._add_cylinder_geometry(geometry, prim)
-        elif prim.IsA(UsdGeom.Sphere):
+        elif type_name == "Sphere":
             self._add_sphere_geometry(geometry, prim)
-        elif prim.IsA(UsdGeom.Cone):
+        elif type_name == "Cone":
             self._add_cone_geometry(geometry, prim)
 
         # 添加碰撞信息（简化为视觉几何）
         collision = ET.SubElement(link, "collision")
-        collision.append(ET.SubElement(collision, "origin"))
+        ET.SubElement(collision, "origin")
         collision_geometry = ET.SubElement(collision, "geometry")
 
-        # 修正后代码
+        # 复制视觉几何（包括子节点）作为碰撞几何
         if len(geometry):
-            geom_element = geometry[0]
-            new_element = ET.Element(geom_element.tag, geom_element.attrib)
-            new_element.text = geom_element.text
-            new_element.tail = geom_element.tail
-            collision_geometry.append(new_element)
+            collision_geometry.append(copy.deepcopy(geometry[0]))
 
         # 添加惯性信息（默认值，需根据实际模型调整）
         inertia = ET.SubElement(link, "inertial")
-        inertia.append(ET.SubElement(inertia, "mass", value="1.0"))
-        inertia.append(
-            ET.SubElement(
-                inertia,
-                "inertia",
-                ixx="0.1",
-                ixy="0.0",
-                ixz="0.0",
-                iyy="0.1",
-                iyz="0.0",
-                izz="0.1",
-            )
+        ET.SubElement(inertia, "mass", value="1.0")
+        ET.SubElement(
+            inertia,
+            "inertia",
+            ixx="0.1",
+            ixy="0.0",
+            ixz="0.0",
+            iyy="0.1",
+            iyz="0.0",
+            izz="0.1",
         )
 
         return link_name
@@ -620,45 +664,23 @@ class UsdToUrdfConverter:
         joint.set("parent", parent_link)
         joint.set("child", child_link)
 
-        # 设置关节原点（从变换矩阵提取）
-        origin = self._transform_to_origin(transform)
-        if origin:
-            joint.append(origin)
-
-    def _transform_to_origin(self, transform):
-        """将变换矩阵转换为URDF的origin节点"""
-        if not transform:
-            return None
-
-        # 提取平移向量 (x, y, z)
-        translation = (transform[3][0], transform[3][1], transform[3][2])
-
-        # 提取旋转矩阵
-        rotation_matrix = Gf.Matrix3d(
-            transform[0][0],
-            transform[0][1],
-            transform[0][2],
-            transform[1][0],
-            transform[1][1],
-            transform[1][2],
-            transform[2][0],
-            transform[2][1],
-            transform[2][2],
-        )
+        # 设置关节原点（从变换矩阵提取），遍历结束后统一计算
+        self._pending_origins.append((joint, transform))
 
-        # 直接从矩阵提取旋转四元数
-        quat = rotation_matrix.ExtractRotation().GetQuat()
-
-        # 四元数转换为RPY (roll-pitch-yaw)
-        rpy = self._quaternion_to_rpy(quat)
-
-        origin = ET.Element("origin")
-        origin.set("xyz", f"{translation[0]} {translation[1]} {translation[2]}")
+    def _flush_origins(self):
+        """批量计算所有待处理变换矩阵的平移和RPY，生成origin节点"""
+        if not self._pending_origins:
+            return
 
-        if rpy:
-            origin.set("rpy", f"{rpy[0]} {rpy[1]} {rpy[2]}")
+        parents, transforms = zip(*self._pending_origins)
+        self._pending_origins = []
 
-        return origin
+        xyz, rpy = _transforms_to_origins(transforms)
+        for parent, t, r in zip(parents, xyz.tolist(), rpy.tolist()):
+            origin = ET.Element("origin")
+            origin.set("xyz", f"{t[0]} {t[1]} {t[2]}")
+            origin.set("rpy", f"{r[0]} {r[1]} {r[2]}")
+            parent.insert(0, origin)
 
     def _quaternion_to_rpy(self, quat):
         """四元数(qw, qx, qy, qz)转换为rpy（roll-pitch-yaw）"""
@@ -666,169 +688,192 @@ class UsdToUrdfConverter:
         qw = quat.GetReal()
         qx, qy, qz = quat.GetImaginary()
 
-        # 四元数转RPY的标准公式
-        roll = np.arctan2(2 * (qw * qx + qy * qz), 1 - 2 * (qx**2 + qy**2))
-        pitch = np.arcsin(2 * (qw * qy - qz * qx))
-        yaw = np.arctan2(2 * (qw * qz + qx * qy), 1 - 2 * (qy**2 + qz**2))
-
-        return (roll, pitch, yaw)
-
-
-def find_texture_files(material, stage):
-    """查找材质网络中的所有纹理文件"""
-    texture_files = {}
-
-    # 获取材质的输出连接
-    outputs = material.GetOutputs()
-
-    # 遍历所有输出，查找连接的着色器
-    for output in outputs:
-        connections = output.GetConnectedSources()
-        for connection in connections:
-            connection = connection[0]
-            if connection.IsValid():
-                source_prim = connection.source
-                if not source_prim:
-                    print(f"警告: 连接源基本体无效: {connection}")
-                    continue
-
-                # 检查是否是着色器
-                shader = UsdShade.Shader(source_prim)
-                if not shader:
-                    continue
-
-                # 尝试获取着色器ID
-                shader_id = None
-                id_attr = shader.GetIdAttr()
-                if id_attr:
-                    shader_id = id_attr.Get()
-
-                # 检查是否是纹理节点（终极兼容性方法）
-                is_texture = False
-                if shader_id and "Texture" in shader_id:
-                    is_texture = True
-                else:
-                    # 检查是否有"file"输入
-                    file_input = shader.GetInput("file")
-                    if file_input:
-                        is_texture = True
-
-                if is_texture:
-                    # 获取纹理文件路径
-                    file_input = shader.GetInput("file")
-                    if file_input and file_input.HasValue():
-                        texture_path = file_input.Get()
-
-                        # 确定纹理类型
-                        texture_type = determine_texture_type(output.GetBaseName())
-
-                        # 存储纹理路径
-                        texture_files[texture_type] = texture_path
-
-                        print(f"找到{texture_type}纹理: {texture_path}")
-
-                # 如果是表面着色器，继续深入查找
-                is_surface_shader = False
-                if shader_id and "Surface" in shader_id:
-                    is_surface_shader = True
-                else:
-                    # 检查是否有"surface"输出
-                    surface_output = shader.GetOutput("surface")
-                    if surface_output:
-                        is_surface_shader = True
-
-                if is_surface_shader:
-                    # 查找着色器可能连接的纹理输入
-                    # 常见的纹理输入名称
-                    texture_input_names = [
-                        "diffuseColor",
-                        "baseColor",
-                        "normal",
-                        "roughness",
-                        "metallic",
-                        "specularColor",
-                    ]
-
-                    for input_name in texture_input_names:
-                        input_obj = shader.GetInput(input_name)
-                        if input_obj:
-                            input_conn = input_obj.GetConnectedSources()
-                            for conn in input_conn:
-                                if conn.IsValid():
-                                    # 获取输入连接的源基本体
-                                    input_source_prim = conn.source
-                                    if input_source_prim:
-                                        # 检查是否是纹理节点
-                                        nested_shader = UsdShade.Shader(
-                                            input_source_prim
-                                        )
-                                        if nested_shader:
-                                            # 递归检查这个着色器
-                                            nested_textures = (
-                                                find_texture_files_in_shader(
-                                                    nested_shader
-                                                )
-                                            )
-                                            for (
-                                                tex_type,
-                                                tex_path,
-                                            ) in nested_textures.items():
-                                                texture_files[tex_type] = tex_path
-
-    return texture_files
-
-
-def find_texture_files_in_shader(shader):
-    """在单个着色器节点中查找纹理文件"""
-    textures = {}
-
-    # 尝试获取着色器ID
-    shader_id = None
-    id_attr = shader.GetIdAttr()
-    if id_attr:
-        shader_id = id_attr.Get()
-
-    # 检查是否是纹理节点
-    is_texture = False
-    if shader_id and "Texture" in shader_id:
-        is_texture = True
-    else:
-        # 检查是否有"file"输入
-        file_input = shader.GetInput("file")
-        if file_input:
-            is_texture = True
-
-    if is_texture:
-        # 获取纹理文件路径
-        file_input = shader.GetInput("file")
-        if file_input and file_input.HasValue():
-            texture_path = file_input.Get()
-            texture_type = determine_texture_type(shader.GetPrim().GetName())
-            textures[texture_type] = texture_path
-
-    return textures
-
-
-def determine_texture_type(name):
-    """根据名称确定纹理类型"""
-    name = name.lower()
-
-    if "diffuse" in name or "albedo" in name or "basecolor" in name:
-        return "diffuse"
-    elif "normal" in name or "bump" in name:
-        return "normal"
-    elif "roughness" in name:
-        return "roughness"
-    elif "metallic" in name or "metalness" in name:
-        return "metallic"
-    elif "specular" in name:
-        return "specular"
-    elif "emissive" in name:
-        return "emissive"
-    elif "opacity" in name or "alpha" in name:
-        return "opacity"
-    else:
-        return "unknown_" + name
+        return _rpy_from_wxyz(qw, qx, qy, qz)
+
+
+def _add_leaf(tb, tag, attrs):
+    """向 TreeBuilder 添加没有子节点的元素"""
+    tb.start(tag, attrs)
+    tb.end(tag)
+
+
+def _rpy_from_wxyz(qw, qx, qy, qz):
+    """单个四元数转RPY，使用标量数学函数，避免 NumPy 标量 ufunc 的调用开销"""
+    # 四元数转RPY的标准公式
+    roll = math.atan2(2 * (qw * qx + qy * qz), 1 - 2 * (qx * qx + qy * qy))
+    # 数值误差可能使参数略超出 [-1, 1]
+    pitch = math.asin(min(1.0, max(-1.0, 2 * (qw * qy - qz * qx))))
+    yaw = math.atan2(2 * (qw * qz + qx * qy), 1 - 2 * (qy * qy + qz * qz))
+    return (roll, pitch, yaw)
+
+
+# 安装了 numba 时编译为机器码
+if njit is not None:
+    _rpy_from_wxyz = njit(cache=True, fastmath=True)(_rpy_from_wxyz)
+
+
+def _quaternions_to_rpy(quats):
+    """批量将 (N, 4) 的四元数 (qw, qx, qy, qz) 转换为 (N, 3) 的RPY"""
+    quats = np.asarray(quats, dtype=np.float64).reshape(-1, 4)
+    qw, qx, qy, qz = quats.T
+    roll = np.arctan2(2 * (qw * qx + qy * qz), 1 - 2 * (qx * qx + qy * qy))
+    pitch = np.arcsin(np.clip(2 * (qw * qy - qz * qx), -1.0, 1.0))
+    yaw = np.arctan2(2 * (qw * qz + qx * qy), 1 - 2 * (qy * qy + qz * qz))
+    return np.stack((roll, pitch, yaw), axis=1)
+
+
+def _rotations_to_quaternions(rotations):
+    """批量将 (N, 3, 3) 的旋转矩阵（列向量约定）转换为 (N, 4) 的四元数 (qw, qx, qy, qz)
+
+    取对称矩阵 K 最大特征值对应的特征向量，矩阵含缩放或轻微非正交时也能得到最接近的旋转
+    """
+    m = np.asarray(rotations, dtype=np.float64)
+    m00, m01, m02 = m[:, 0, 0], m[:, 0, 1], m[:, 0, 2]
+    m10, m11, m12 = m[:, 1, 0], m[:, 1, 1], m[:, 1, 2]
+    m20, m21, m22 = m[:, 2, 0], m[:, 2, 1], m[:, 2, 2]
+
+    k = np.empty((len(m), 4, 4))
+    k[:, 0, 0] = m00 - m11 - m22
+    k[:, 1, 0] = m01 + m10
+    k[:, 1, 1] = m11 - m00 - m22
+    k[:, 2, 0] = m02 + m20
+    k[:, 2, 1] = m12 + m21
+    k[:, 2, 2] = m22 - m00 - m11
+    k[:, 3, 0] = m21 - m12
+    k[:, 3, 1] = m02 - m20
+    k[:, 3, 2] = m10 - m01
+    k[:, 3, 3] = m00 + m11 + m22
+
+    # eigh 只使用下三角；特征值升序排列，最后一列即所需特征向量 (qx, qy, qz, qw)
+    _, vecs = np.linalg.eigh(k / 3.0)
+    quats = vecs[:, [3, 0, 1, 2], -1]
+    # q 与 -q 表示同一旋转，统一为 qw >= 0
+    quats[quats[:, 0] < 0] *= -1
+    return quats
+
+
+def _transforms_to_origins(transforms):
+    """批量从 Gf.Matrix4d 中提取平移 (N, 3) 和RPY (N, 3)"""
+    mats = np.asarray(transforms, dtype=np.float64).reshape(-1, 4, 4)
+    # Gf 使用行向量，平移在第4行，旋转矩阵需转置为列向量约定
+    xyz = mats[:, 3, :3]
+    rotations = mats[:, :3, :3].transpose(0, 2, 1)
+    rpy = _quaternions_to_rpy(_rotations_to_quaternions(rotations))
+    return xyz, rpy
+
+
+# 面索引格式，按 (是否有纹理坐标, 是否有法线) 区分：
+# v/vt/vn、v/vt、v//vn、v
+_FACE_INDEX_SEPARATORS = {
+    (True, True): ("/", "/"),
+    (True, False): ("/",),
+    (False, True): ("//",),
+    (False, False): (),
+}
+
+# 同一网格的顶点布局固定，按布局预先生成单个顶点的格式，整体格式化时直接取用
+_FACE_VERTEX_FORMATS = {
+    layout: "%d" + "".join(sep + "%d" for sep in separators)
+    for layout, separators in _FACE_INDEX_SEPARATORS.items()
+}
+
+
+def _vt_to_numpy(values, dtype, width=None):
+    """将 VtArray 转换为 NumPy 数组，类型一致时共享内存不复制，属性未设置时返回空数组"""
+    if values is None:
+        values = ()
+    array = np.asarray(values, dtype=dtype)
+    if width is not None:
+        array = array.reshape(-1, width)
+    return array
+
+
+class _PresizedBuffer:
+    """按预估大小一次分配的 bytearray 输出缓冲区，按偏移写入；预估不足时切片赋值会自动扩展"""
+
+    __slots__ = ("buf", "off")
+
+    def __init__(self, size):
+        self.buf = bytearray(size)
+        self.off = 0
+
+    def write(self, data):
+        # 只接受 bytes 类数据，传入 str 时切片赋值抛出 TypeError，np.savetxt 会据此改为写入编码后的 bytes
+        n = len(data)
+        self.buf[self.off : self.off + n] = data
+        self.off += n
+        return n
+
+    def getbuffer(self):
+        """返回已写入部分的 memoryview，不复制数据"""
+        return memoryview(self.buf)[: self.off]
+
+
+def _estimate_obj_size(points, normals, tex_coords, face_vertex_counts, obj_vertex_indices):
+    """估算OBJ文本大小（字节），用于预先分配缓冲区"""
+    # 每行 v/vn 约40字节、vt 约28字节，每个面索引约24字节（含 v/vt/vn），每个面行首约4字节
+    return (
+        256
+        + 40 * (len(points) + len(normals))
+        + 28 * len(tex_coords)
+        + 24 * len(obj_vertex_indices)
+        + 4 * len(face_vertex_counts)
+    )
+
+
+def _format_faces(face_vertex_counts, obj_vertex_indices, has_tex_coords, has_normals):
+    """整体格式化所有面的索引，按 face_vertex_counts 分组为 f 行（bytes）
+
+    obj_vertex_indices 为已加1的OBJ索引（从1开始）
+    """
+    counts = face_vertex_counts
+    if not counts.size:
+        return b""
+
+    # 顶点布局在整个网格内不变，只选择一次
+    layout = (has_tex_coords, has_normals)
+    separators = _FACE_INDEX_SEPARATORS[layout]
+
+    # 全三角形或全四边形等顶点数一致的网格，重塑为 (F, k) 后由 savetxt 一次格式化
+    k = int(counts[0])
+    if k > 0 and counts.min() == counts.max() == k:
+        columns = np.repeat(
+            obj_vertex_indices.reshape(-1, k), len(separators) + 1, axis=1
+        )
+        out = io.BytesIO()
+        np.savetxt(
+            out, columns, fmt="f " + " ".join([_FACE_VERTEX_FORMATS[layout]] * k)
+        )
+        return out.getvalue()
+
+    # 每个顶点的 v/vt/vn 索引串只格式化一次，再按面索引取出，共享顶点不重复格式化
+    index_str = np.char.mod("%d", np.arange(1, int(obj_vertex_indices.max()) + 1))
+    vertex_tokens = index_str
+    for sep in separators:
+        vertex_tokens = np.char.add(np.char.add(vertex_tokens, sep), index_str)
+    tokens = vertex_tokens[obj_vertex_indices - 1]
+
+    # 每个面的第一个索引前换行并加 f，其余索引前加空格
+    prefixes = np.full(tokens.shape, " ", dtype="<U3")
+    starts = np.cumsum(counts) - counts
+    prefixes[starts[counts > 0]] = "\nf "
+    return ("".join(np.char.add(prefixes, tokens).tolist())[1:] + "\n").encode("ascii")
+
+
+def _write_bytes(path, data):
+    """通过原始文件描述符写入数据，绕过文本IO层"""
+    view = memoryview(data)
+    fd = os.open(
+        path,
+        os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_CLOEXEC", 0),
+        0o644,
+    )
+    try:
+        # os.write 可能只写入部分数据，循环直到全部写完
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
 
 
 def export_materials_and_textures(stage, output_dir):
@@ -856,131 +901,72 @@ def export_materials_and_textures(stage, output_dir):
         # 查找纹理引用并导出到textures目录
 
 
-def write_material_file(material, mtl_path, textures_dir, stage):
-    """写入材质文件(.mtl)并处理纹理"""
-    import shutil
-
-    try:
-        with open(mtl_path, "w") as f:
-            material_name = material.GetPrim().GetName()
-            f.write(f"# Material file\n")
-            f.write(f"newmtl {material_name}\n")
-
-            # 设置默认材质属性
-            f.write("Ns 96.078431\n")  # 光泽度
-            f.write("Ka 1.000000 1.000000 1.000000\n")  # 环境光颜色
-            f.write("Kd 1.000000 1.000000 1.000000\n")  # 漫反射颜色
-            f.write("Ks 1.000000 1.000000 1.000000\n")  # 镜面反射颜色
-            f.write("Ni 1.000000\n")  # 光学密度
-            f.write("d 1.000000\n")  # 透明度
-            f.write("illum 2\n")  # 光照模型
-
-            # 提取纹理信息
-            texture_files = find_texture_files(material, stage)
-
-            # 处理基础颜色/漫反射纹理
-            if "diffuse" in texture_files:
-                src_texture = texture_files["diffuse"]
-                dest_texture = os.path.join(textures_dir, os.path.basename(src_texture))
-
-                # 复制纹理文件
-                try:
-                    if not os.path.exists(dest_texture):
-                        shutil.copy2(src_texture, dest_texture)
-                        print(f"复制纹理: {src_texture} -> {dest_texture}")
-                    else:
-                        print(f"纹理已存在: {dest_texture}")
-
-                    # 在MTL文件中引用纹理
-                    f.write(f"map_Kd ../textures/{os.path.basename(src_texture)}\n")
-                except Exception as e:
-                    print(f"复制纹理失败: {e}")
-
-            # 处理法线贴图
-            if "normal" in texture_files:
-                src_texture = texture_files["normal"]
-                dest_texture = os.path.join(textures_dir, os.path.basename(src_texture))
-
-                try:
-                    if not os.path.exists(dest_texture):
-                        shutil.copy2(src_texture, dest_texture)
-                        print(f"复制法线贴图: {src_texture} -> {dest_texture}")
-
-                    # 在MTL文件中引用法线贴图
-                    f.write(f"map_bump ../textures/{os.path.basename(src_texture)}\n")
-                except Exception as e:
-                    print(f"复制法线贴图失败: {e}")
-
-            # 处理其他纹理类型（如粗糙度、金属度等）
-            for tex_type, tex_path in texture_files.items():
-                if tex_type not in ["diffuse", "normal"]:
-                    src_texture = tex_path
-                    dest_texture = os.path.join(
-                        textures_dir, os.path.basename(src_texture)
-                    )
-
-                    try:
-                        if not os.path.exists(dest_texture):
-                            shutil.copy2(src_texture, dest_texture)
-                            print(
-                                f"复制{tex_type}贴图: {src_texture} -> {dest_texture}"
-                            )
+def _is_joint(prim):
+    """检查prim是否表示关节"""
+    # 关节类型只取决于prim的类型名，每种类型名只用schema判断一次
+    type_name = prim.GetTypeName()
+    is_joint = _JOINT_TYPE_NAMES.get(type_name)
+    if is_joint is None:
+        joint_types = [
+            UsdPhysics.RevoluteJoint,
+            UsdPhysics.PrismaticJoint,
+            UsdPhysics.SphericalJoint,
+            UsdPhysics.FixedJoint,
+        ]
+        is_joint = _JOINT_TYPE_NAMES[type_name] = any(
+            joint_type(prim) for joint_type in joint_types
+        )
+    return is_joint
 
-                        # 根据纹理类型写入适当的MTL指令
-                        if tex_type == "roughness":
-                            f.write(
-                                f"map_Pr ../textures/{os.path.basename(src_texture)}\n"
-                            )
-                        elif tex_type == "metallic":
-                            f.write(
-                                f"map_Pm ../textures/{os.path.basename(src_texture)}\n"
-                            )
-                        # 可以添加更多纹理类型映射
 
-                    except Exception as e:
-                        print(f"复制{tex_type}贴图失败: {e}")
+def _get_body_link(body_rel, link_paths):
+    """根据关节的body关系查找对应的链接名称
 
-            print(f"成功导出材质文件到 {mtl_path}")
+    link_paths 为按路径排序的 (mesh路径, 链接名称) 列表，
+    刚体本身是mesh时直接匹配，否则取其下第一个mesh所在的链接
+    """
+    targets = body_rel.GetTargets() if body_rel else None
+    if not targets:
+        return None
 
-    except Exception as e:
-        print(f"导出材质文件失败: {e}")
+    body_path = targets[0].pathString
+    prefix = body_path + "/"
+    # 二分查找：刚体路径本身排在其所有子路径之前；
+    # 两者之间可能夹着 "/A/B-x" 这类同前缀的兄弟路径，因此子路径按 prefix 再查找一次
+    i = 0
+    for path in (body_path, prefix):
+        i = bisect.bisect_left(link_paths, path, lo=i, key=_mesh_path_of)
+        if i < len(link_paths):
+            mesh_path, link_name = link_paths[i]
+            if mesh_path == body_path or mesh_path.startswith(prefix):
+                return link_name
+    return None
 
 
-def _is_joint(prim):
-    """检查prim是否表示关节"""
-    # 检查是否应用了PhysicsJoint API
-    # return UsdPhysics.Joint(prim) is not None
-    joint_types = [
-        UsdPhysics.RevoluteJoint,
-        UsdPhysics.PrismaticJoint,
-        UsdPhysics.SphericalJoint,
-        UsdPhysics.FixedJoint,
-        # UsdPhysics.D6Joint
-    ]
-    for joint_type in joint_types:
-        if joint_type(prim):
-            return True
-    return False
+def _mesh_path_of(item):
+    """取 (mesh路径, 链接名称) 中的mesh路径，作为二分查找的键"""
+    return item[0]
 
 
 def _check_if_collision(prims):
     """检查prim 数组是否为碰撞体"""
 
+    # 先做类型名和属性这类廉价检查，schema 判断放在最后
     for prim in prims:
 
-        # 方法1: 检查是否应用了CollisionAPI
-        if UsdPhysics.CollisionAPI(prim):
-            return True, prim
-
-        # 方法2: 检查是否为CollisionMesh类型
+        # 方法1: 检查是否为CollisionMesh类型
         if prim.GetTypeName() == "Scope" and prim.GetName() == "Collisions":
             return True, prim
 
-        # 方法3: 检查primvars中是否有 collisionPurpose
+        # 方法2: 检查primvars中是否有 collisionPurpose
         if prim.HasAttribute("primvars:collisionPurpose"):
             return True, prim
 
-    return False
+        # 方法3: 检查是否应用了CollisionAPI，HasAPI 只查询已应用的schema列表，不构造schema对象
+        if prim.HasAPI(UsdPhysics.CollisionAPI):
+            return True, prim
+
+    return False, None
 
 
 def _get_collision_info(prim):
@@ -1,7 +1,15 @@
+import io
+import logging
 import os
-from pxr import Usd, UsdGeom, Gf, Sdf, UsdShade
+from dataclasses import dataclass, field
+import numpy as np
+from pxr import Usd, UsdGeom, UsdShade
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from utils.usd_mtl import (
+    TextureExport,
+    copy_textures,
+    write_material_file,
+)
 
 # 静态变量配置
 INPUT_USD_FILE = "D:\project\SmileX\capture-resource-python\Lightwheel_Refrigerator044/Refrigerator044.usd"  # 输入USD文件路径
@@ -9,6 +17,23 @@ OUTPUT_DIR = "D:\project\SmileX\capture-resource-python\Lightwheel_Refrigerator0
 
 print(Usd.GetVersion())
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class LinkTable:
+    """网格链接表，按列保存所有链接的数据，第 i 行对应第 i 个链接"""
+
+    # 链接名称
+    names: list = field(default_factory=list)
+    # 网格prim，导出时直接使用，无需按路径重新查找
+    prims: list = field(default_factory=list)
+    # 世界坐标系下的平移，形状 (N, 3)
+    translations: np.ndarray = field(default_factory=lambda: np.empty((0, 3)))
+
+    def __len__(self):
+        return len(self.names)
+
 
 def parse_usd_file(usd_path):
     """解析USD文件，提取关节和链接信息"""
@@ -17,30 +42,29 @@ def parse_usd_file(usd_path):
         raise ValueError(f"无法打开USD文件: {usd_path}")
 
     # 存储链接和关节信息
-    links = {}
+    links = LinkTable()
     joints = []
 
-    # 遍历所有primitives
+    # 遍历所有primitives，同名网格保留最后一个，位置与第一次出现时相同
+    row_of = {}
     for prim in stage.Traverse():
         if prim.IsA(UsdGeom.Mesh):
             link_name = prim.GetName()
-            # 获取mesh路径和变换
-            mesh_prim = UsdGeom.Mesh(prim)
-            mesh_path = str(mesh_prim.GetPrim().GetPath())  # 修正此处
-
-            # 获取变换矩阵
-            xform = UsdGeom.Xformable(prim)
-            transform = xform.ComputeLocalToWorldTransform(Usd.TimeCode.Default())
-            translation = Gf.Vec3d(transform.ExtractTranslation())
-            rotation = Gf.Rotation(transform.ExtractRotation())
-
-            links[link_name] = {
-                "mesh_path": mesh_path,
-                "translation": translation,
-                "rotation": rotation,
-                "visual_mesh": None,  # 后续填充
-                "collision_mesh": None,  # 后续填充
-            }
+            row = row_of.get(link_name)
+            if row is None:
+                row_of[link_name] = len(links.names)
+                links.names.append(link_name)
+                links.prims.append(prim)
+            else:
+                links.prims[row] = prim
+
+    # 预先分配平移数组，逐个写入世界坐标系下的平移（URDF中旋转固定写为 0 0 0）；
+    # XformCache 缓存祖先节点的变换，共同的父节点只计算一次
+    links.translations = np.empty((len(links), 3))
+    xform_cache = UsdGeom.XformCache(Usd.TimeCode.Default())
+    for row, prim in enumerate(links.prims):
+        transform = xform_cache.GetLocalToWorldTransform(prim)
+        links.translations[row] = transform.ExtractTranslation()
 
     # 这里需要根据USD中的层次结构和约束关系推断关节
     # 简化版：假设每个子链接通过关节连接到父链接
@@ -55,16 +79,13 @@ def create_urdf_structure(links, joints, output_dir):
     robot = ET.Element("robot", name="generated_robot")
 
     # 添加links
-    for link_name, link_data in links.items():
+    for link_name, (x, y, z) in zip(links.names, links.translations.tolist()):
         link = ET.SubElement(robot, "link", name=link_name)
 
         # 添加视觉元素
         visual = ET.SubElement(link, "visual")
         origin = ET.SubElement(
-            visual,
-            "origin",
-            xyz=f"{link_data['translation'][0]} {link_data['translation'][1]} {link_data['translation'][2]}",
-            rpy="0 0 0",
+            visual, "origin", xyz=f"{x} {y} {z}", rpy="0 0 0"
         )  # 简化的旋转表示
         geometry = ET.SubElement(visual, "geometry")
 
@@ -72,11 +93,6 @@ def create_urdf_structure(links, joints, output_dir):
         mesh_file = f"meshes/{link_name}.obj"
         mesh = ET.SubElement(geometry, "mesh", filename=mesh_file)
 
-        # 添加材质（如果有）
-        if "material" in link_data:
-            material = ET.SubElement(visual, "material", name=link_data["material"])
-            color = ET.SubElement(material, "color", rgba="1 1 1 1")  # 默认白色
-
     # 添加joints
     for joint in joints:
         joint_element = ET.SubElement(
@@ -102,12 +118,13 @@ def create_urdf_structure(links, joints, output_dir):
                 upper=str(joint.get("upper", 0)),
             )
 
-    # 美化XML输出
-    xml_str = minidom.parseString(ET.tostring(robot)).toprettyxml(indent="  ")
+    # 美化XML输出，直接在元素树上缩进，不再经 minidom 重新解析
+    ET.indent(robot, space="  ")
+    xml_str = ET.tostring(robot, encoding="unicode", xml_declaration=True)
 
     # 保存URDF文件
     urdf_path = os.path.join(output_dir, "robot.urdf")
-    with open(urdf_path, "w") as f:
+    with open(urdf_path, "w", encoding="utf-8") as f:
         f.write(xml_str)
 
     return urdf_path
@@ -153,37 +170,46 @@ def export_meshes(stage, links, output_dir):
     # 创建textures目录
     textures_dir = os.path.join(output_dir, "textures")
     os.makedirs(textures_dir, exist_ok=True)
+    # 本次导出的纹理登记状态（只读取一次textures目录），网格导出完成后一起并行复制
+    textures = TextureExport.for_dir(textures_dir)
+    # 输出目录前缀（带路径分隔符），循环内只需拼接文件名，不再逐个调用 os.path.join
+    meshes_prefix = os.path.join(meshes_dir, "")
+    materials_prefix = os.path.join(materials_dir, "")
 
     # 为每个网格创建OBJ文件
-    for link_name, link_data in links.items():
-        mesh_prim = stage.GetPrimAtPath(Sdf.Path(link_data["mesh_path"]))
+    for link_name, mesh_prim in zip(links.names, links.prims):
         if not mesh_prim or not mesh_prim.IsA(UsdGeom.Mesh):
-            print(f"警告: {link_data['mesh_path']} 不是有效的网格，跳过导出")
+            logger.warning(f"{mesh_prim.GetPath()} 不是有效的网格，跳过导出")
             continue
 
-        obj_path = os.path.join(meshes_dir, f"{link_name}.obj")
-        mtl_path = os.path.join(materials_dir, f"{link_name}.mtl")
+        obj_path = meshes_prefix + link_name + ".obj"
+        mtl_path = materials_prefix + link_name + ".mtl"
 
         try:
             mesh = UsdGeom.Mesh(mesh_prim)
 
-            # 获取顶点数据
-            points = mesh.GetPointsAttr().Get()
-            if not points:
-                print(f"警告: 网格 {link_name} 没有顶点数据，跳过导出")
+            # 获取顶点数据，转换为 NumPy 数组以便整体格式化
+            points = _to_numpy(mesh.GetPointsAttr().Get(), 3)
+            if not len(points):
+                logger.warning(f"网格 {link_name} 没有顶点数据，跳过导出")
                 continue
 
             # 获取法线数据
-            normals = mesh.GetNormalsAttr().Get()
+            normals = _to_numpy(mesh.GetNormalsAttr().Get(), 3)
 
             # 获取纹理坐标
-            tex_coords = None
+            tex_coords = _to_numpy(None, 2)
             if mesh.GetPrim().HasAttribute("st"):
-                tex_coords = mesh.GetPrim().GetAttribute("st").Get()
+                tex_coords = _to_numpy(mesh.GetPrim().GetAttribute("st").Get(), 2)
 
-            # 获取面索引
-            face_vertex_counts = mesh.GetFaceVertexCountsAttr().Get()
-            face_vertex_indices = mesh.GetFaceVertexIndicesAttr().Get()
+            # 获取面索引，转换为 NumPy 数组后整体加1得到OBJ索引（从1开始）
+            face_vertex_counts = np.asarray(
+                mesh.GetFaceVertexCountsAttr().Get() or (), dtype=np.int32
+            )
+            face_vertex_indices = np.asarray(
+                mesh.GetFaceVertexIndicesAttr().Get() or (), dtype=np.int32
+            )
+            obj_vertex_indices = face_vertex_indices + 1
 
             # 尝试获取材质绑定
             material_binding = UsdShade.MaterialBindingAPI(mesh_prim)
@@ -195,311 +221,109 @@ def export_meshes(stage, links, output_dir):
                 material_name = material.GetPrim().GetName()
 
                 # 尝试提取材质信息和贴图
-                write_material_file(material, mtl_path, textures_dir, stage)
-
-            # 写入OBJ文件
-            with open(obj_path, "w") as f:
-                # 写入文件头
-                f.write(f"# OBJ file exported from USD\n")
-                f.write(f"# Mesh: {link_name}\n")
-
-                # 如果有材质，引用材质文件
-                if material_name:
-                    f.write(f"mtllib ../materials/{link_name}.mtl\n")
-
-                # 写入顶点
-                for point in points:
-                    f.write(f"v {point[0]} {point[1]} {point[2]}\n")
-
-                # 写入法线
-                if normals:
-                    for normal in normals:
-                        f.write(f"vn {normal[0]} {normal[1]} {normal[2]}\n")
-
-                # 写入纹理坐标
-                if tex_coords:
-                    for coord in tex_coords:
-                        f.write(f"vt {coord[0]} {coord[1]}\n")
-
-                # 写入面
-                current_vertex_index = 0
-                for i, count in enumerate(face_vertex_counts):
-                    indices = face_vertex_indices[
-                        current_vertex_index : current_vertex_index + count
-                    ]
-
-                    # 写入材质组（如果有）
-                    if material_name and i == 0:
-                        f.write(f"usemtl {material_name}\n")
-
-                    # 构建面的索引字符串
-                    face_str = "f"
-                    for idx in indices:
-                        vertex_idx = idx + 1  # OBJ索引从1开始
-
-                        if tex_coords and normals:
-                            face_str += f" {vertex_idx}/{vertex_idx}/{vertex_idx}"
-                        elif tex_coords:
-                            face_str += f" {vertex_idx}/{vertex_idx}"
-                        elif normals:
-                            face_str += f" {vertex_idx}//{vertex_idx}"
-                        else:
-                            face_str += f" {vertex_idx}"
-
-                    f.write(f"{face_str}\n")
-                    current_vertex_index += count
-
-            print(f"成功导出网格 {link_name} 到 {obj_path}")
-
-        except Exception as e:
-            print(f"导出网格 {link_name} 失败: {e}")
-
+                write_material_file(
+                    material,
+                    mtl_path,
+                    textures_dir,
+                    stage,
+                    textures=textures,
+                )
+
+            # 先在内存缓冲区中格式化整个OBJ内容，最后一次写入文件
+            f = io.BytesIO()
+
+            # 写入文件头
+            f.write(f"# OBJ file exported from USD\n# Mesh: {link_name}\n".encode("utf-8"))
+
+            # 如果有材质，引用材质文件
+            if material_name:
+                f.write(f"mtllib ../materials/{link_name}.mtl\n".encode("utf-8"))
+
+            # 写入顶点，整个数组一次格式化，%.9g 可以无损表示 float32
+            np.savetxt(f, points, fmt="v %.9g %.9g %.9g")
+
+            # 写入法线
+            if len(normals):
+                np.savetxt(f, normals, fmt="vn %.9g %.9g %.9g")
+
+            # 写入纹理坐标
+            if len(tex_coords):
+                np.savetxt(f, tex_coords, fmt="vt %.9g %.9g")
+
+            # 写入材质组（如果有）
+            if material_name and len(face_vertex_counts):
+                f.write(f"usemtl {material_name}\n".encode("utf-8"))
+
+            # 写入面
+            _write_faces(
+                f,
+                face_vertex_counts,
+                obj_vertex_indices,
+                len(tex_coords) > 0,
+                len(normals) > 0,
+            )
 
-def write_material_file(material, mtl_path, textures_dir, stage):
-    """写入材质文件(.mtl)并处理纹理"""
-    import shutil
+            # 无缓冲打开，整个内容一次写入OBJ文件
+            with open(obj_path, "wb", buffering=0) as obj_file:
+                obj_file.write(f.getbuffer())
 
-    try:
-        with open(mtl_path, "w") as f:
-            material_name = material.GetPrim().GetName()
-            f.write(f"# Material file\n")
-            f.write(f"newmtl {material_name}\n")
-
-            # 设置默认材质属性
-            f.write("Ns 96.078431\n")  # 光泽度
-            f.write("Ka 1.000000 1.000000 1.000000\n")  # 环境光颜色
-            f.write("Kd 1.000000 1.000000 1.000000\n")  # 漫反射颜色
-            f.write("Ks 1.000000 1.000000 1.000000\n")  # 镜面反射颜色
-            f.write("Ni 1.000000\n")  # 光学密度
-            f.write("d 1.000000\n")  # 透明度
-            f.write("illum 2\n")  # 光照模型
-
-            # 提取纹理信息
-            texture_files = find_texture_files(material, stage)
-
-            # 处理基础颜色/漫反射纹理
-            if "diffuse" in texture_files:
-                src_texture = texture_files["diffuse"]
-                dest_texture = os.path.join(textures_dir, os.path.basename(src_texture))
-
-                # 复制纹理文件
-                try:
-                    if not os.path.exists(dest_texture):
-                        shutil.copy2(src_texture, dest_texture)
-                        print(f"复制纹理: {src_texture} -> {dest_texture}")
-                    else:
-                        print(f"纹理已存在: {dest_texture}")
-
-                    # 在MTL文件中引用纹理
-                    f.write(f"map_Kd ../textures/{os.path.basename(src_texture)}\n")
-                except Exception as e:
-                    print(f"复制纹理失败: {e}")
-
-            # 处理法线贴图
-            if "normal" in texture_files:
-                src_texture = texture_files["normal"]
-                dest_texture = os.path.join(textures_dir, os.path.basename(src_texture))
-
-                try:
-                    if not os.path.exists(dest_texture):
-                        shutil.copy2(src_texture, dest_texture)
-                        print(f"复制法线贴图: {src_texture} -> {dest_texture}")
-
-                    # 在MTL文件中引用法线贴图
-                    f.write(f"map_bump ../textures/{os.path.basename(src_texture)}\n")
-                except Exception as e:
-                    print(f"复制法线贴图失败: {e}")
-
-            # 处理其他纹理类型（如粗糙度、金属度等）
-            for tex_type, tex_path in texture_files.items():
-                if tex_type not in ["diffuse", "normal"]:
-                    src_texture = tex_path
-                    dest_texture = os.path.join(
-                        textures_dir, os.path.basename(src_texture)
-                    )
-
-                    try:
-                        if not os.path.exists(dest_texture):
-                            shutil.copy2(src_texture, dest_texture)
-                            print(
-                                f"复制{tex_type}贴图: {src_texture} -> {dest_texture}"
-                            )
-
-                        # 根据纹理类型写入适当的MTL指令
-                        if tex_type == "roughness":
-                            f.write(
-                                f"map_Pr ../textures/{os.path.basename(src_texture)}\n"
-                            )
-                        elif tex_type == "metallic":
-                            f.write(
-                                f"map_Pm ../textures/{os.path.basename(src_texture)}\n"
-                            )
-                        # 可以添加更多纹理类型映射
-
-                    except Exception as e:
-                        print(f"复制{tex_type}贴图失败: {e}")
-
-            print(f"成功导出材质文件到 {mtl_path}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"成功导出网格 {link_name} 到 {obj_path}")
 
-    except Exception as e:
-        print(f"导出材质文件失败: {e}")
-
-
-def find_texture_files(material, stage):
-    """查找材质网络中的所有纹理文件"""
-    texture_files = {}
-
-    # 获取材质的输出连接
-    outputs = material.GetOutputs()
-
-    # 遍历所有输出，查找连接的着色器
-    for output in outputs:
-        connections = output.GetConnectedSources()
-        for connection in connections:
-            connection = connection[0]
-            if connection.IsValid():
-                source_prim = connection.source
-                if not source_prim:
-                    print(f"警告: 连接源基本体无效: {connection}")
-                    continue
-
-                # 检查是否是着色器
-                shader = UsdShade.Shader(source_prim)
-                if not shader:
-                    continue
-
-                # 尝试获取着色器ID
-                shader_id = None
-                id_attr = shader.GetIdAttr()
-                if id_attr:
-                    shader_id = id_attr.Get()
-
-                # 检查是否是纹理节点（终极兼容性方法）
-                is_texture = False
-                if shader_id and "Texture" in shader_id:
-                    is_texture = True
-                else:
-                    # 检查是否有"file"输入
-                    file_input = shader.GetInput("file")
-                    if file_input:
-                        is_texture = True
-
-                if is_texture:
-                    # 获取纹理文件路径
-                    file_input = shader.GetInput("file")
-                    if file_input and file_input.HasValue():
-                        texture_path = file_input.Get()
-
-                        # 确定纹理类型
-                        texture_type = determine_texture_type(output.GetBaseName())
-
-                        # 存储纹理路径
-                        texture_files[texture_type] = texture_path
-
-                        print(f"找到{texture_type}纹理: {texture_path}")
-
-                # 如果是表面着色器，继续深入查找
-                is_surface_shader = False
-                if shader_id and "Surface" in shader_id:
-                    is_surface_shader = True
-                else:
-                    # 检查是否有"surface"输出
-                    surface_output = shader.GetOutput("surface")
-                    if surface_output:
-                        is_surface_shader = True
-
-                if is_surface_shader:
-                    # 查找着色器可能连接的纹理输入
-                    # 常见的纹理输入名称
-                    texture_input_names = [
-                        "diffuseColor",
-                        "baseColor",
-                        "normal",
-                        "roughness",
-                        "metallic",
-                        "specularColor",
-                    ]
-
-                    for input_name in texture_input_names:
-                        input_obj = shader.GetInput(input_name)
-                        if input_obj:
-                            input_conn = input_obj.GetConnectedSources()
-                            for conn in input_conn:
-                                if conn.IsValid():
-                                    # 获取输入连接的源基本体
-                                    input_source_prim = conn.source
-                                    if input_source_prim:
-                                        # 检查是否是纹理节点
-                                        nested_shader = UsdShade.Shader(
-                                            input_source_prim
-                                        )
-                                        if nested_shader:
-                                            # 递归检查这个着色器
-                                            nested_textures = (
-                                                find_texture_files_in_shader(
-                                                    nested_shader
-                                                )
-                                            )
-                                            for (
-                                                tex_type,
-                                                tex_path,
-                                            ) in nested_textures.items():
-                                                texture_files[tex_type] = tex_path
-
-    return texture_files
-
-
-def find_texture_files_in_shader(shader):
-    """在单个着色器节点中查找纹理文件"""
-    textures = {}
-
-    # 尝试获取着色器ID
-    shader_id = None
-    id_attr = shader.GetIdAttr()
-    if id_attr:
-        shader_id = id_attr.Get()
-
-    # 检查是否是纹理节点
-    is_texture = False
-    if shader_id and "Texture" in shader_id:
-        is_texture = True
-    else:
-        # 检查是否有"file"输入
-        file_input = shader.GetInput("file")
-        if file_input:
-            is_texture = True
-
-    if is_texture:
-        # 获取纹理文件路径
-        file_input = shader.GetInput("file")
-        if file_input and file_input.HasValue():
-            texture_path = file_input.Get()
-            texture_type = determine_texture_type(shader.GetPrim().GetName())
-            textures[texture_type] = texture_path
-
-    return textures
-
-
-def determine_texture_type(name):
-    """根据名称确定纹理类型"""
-    name = name.lower()
-
-    if "diffuse" in name or "albedo" in name or "basecolor" in name:
-        return "diffuse"
-    elif "normal" in name or "bump" in name:
-        return "normal"
-    elif "roughness" in name:
-        return "roughness"
-    elif "metallic" in name or "metalness" in name:
-        return "metallic"
-    elif "specular" in name:
-        return "specular"
-    elif "emissive" in name:
-        return "emissive"
-    elif "opacity" in name or "alpha" in name:
-        return "opacity"
-    else:
-        return "unknown_" + name
+        except Exception as e:
+            logger.error(f"导出网格 {link_name} 失败: {e}")
+
+    # 所有网格导出完成后，并行复制收集到的纹理
+    copy_textures(textures)
+
+
+def _to_numpy(values, width):
+    """将 VtArray 转换为 float32 的 NumPy 数组，属性未设置时返回空数组"""
+    if values is None:
+        values = ()
+    return np.asarray(values, dtype=np.float32).reshape(-1, width)
+
+
+# 顶点布局 (有纹理坐标, 有法线) -> 单个顶点的OBJ索引格式，同一网格内只选择一次
+_FACE_VERTEX_FORMATS = {
+    (True, True): "%d/%d/%d",
+    (True, False): "%d/%d",
+    (False, True): "%d//%d",
+    (False, False): "%d",
+}
+
+
+def _write_faces(f, face_vertex_counts, obj_vertex_indices, has_tex_coords, has_normals):
+    """将所有面写入二进制缓冲区 f，obj_vertex_indices 为已加1的OBJ索引"""
+    counts = face_vertex_counts
+    if not counts.size:
+        return
+
+    vertex_fmt = _FACE_VERTEX_FORMATS[has_tex_coords, has_normals]
+    refs = vertex_fmt.count("%d")
+
+    # 全三角形或全四边形等顶点数一致的网格，重塑为 (F, k) 后由 savetxt 一次格式化
+    k = int(counts[0])
+    if k > 0 and counts.min() == counts.max() == k:
+        columns = np.repeat(obj_vertex_indices.reshape(-1, k), refs, axis=1)
+        np.savetxt(f, columns, fmt="f " + " ".join([vertex_fmt] * k))
+        return
+
+    # 顶点数不一致时，每个顶点的索引串只格式化一次，再按面索引取出后按偏移量切片拼接
+    vertex_tokens = np.array(
+        [
+            vertex_fmt % ((idx,) * refs)
+            for idx in range(1, int(obj_vertex_indices.max()) + 1)
+        ],
+        dtype=object,
+    )
+    tokens = vertex_tokens[obj_vertex_indices - 1].tolist()
+    offsets = np.concatenate(([0], np.cumsum(counts))).tolist()
+    face_lines = [
+        "f " + " ".join(tokens[start:end]) + "\n"
+        for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+    f.write("".join(face_lines).encode("ascii"))
 
 
 def export_materials_and_textures(stage, output_dir):
@@ -532,11 +356,8 @@ def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
     try:
-        # 解析USD文件
-        links, joints = parse_usd_file(INPUT_USD_FILE)
-
-        # 打开USD阶段用于导出网格
-        stage = Usd.Stage.Open(INPUT_USD_FILE)
+        # 解析USD文件，解析时打开的USD阶段直接用于导出网格
+        links, joints, stage = parse_usd_file(INPUT_USD_FILE)
 
         # 导出网格
         export_meshes(stage, links, OUTPUT_DIR)
@@ -1,15 +1,22 @@
-from pxr import Usd, UsdGeom, UsdPhysics, Gf
-import xml.etree.ElementTree as ET
-import os
+from pxr import Usd, UsdGeom, UsdPhysics
+from xml.sax.saxutils import XMLGenerator
+from collections import deque
+import math
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 class UsdToUrdfConverter:
     def __init__(self):
-        self.urdf_root = ET.Element("robot")
         self.link_id_counter = 0
         self.joint_id_counter = 0
-        self.transform_stack = []
-        self.visited_links = set()
+        # prim路径 -> 生成的名称（Joint以 "路径#j" 为键）
+        self._name_cache: dict[str, str] = {}
+        # 按文档顺序记录的 (类型, 名称, 详细信息, 变换矩阵)，遍历结束后批量计算origin并流式写出
+        self._records = []
         
     def convert(self, usd_file_path, urdf_output_path):
         """主转换函数：解析USD并生成URDF"""
@@ -18,219 +25,252 @@ class UsdToUrdfConverter:
         if not stage:
             raise ValueError(f"无法打开USD文件: {usd_file_path}")
             
+        # 整个遍历共用一个时间码，XformCache 在兄弟节点之间复用已计算的父级变换
+        self._tc = Usd.TimeCode.Default()  # 使用默认时间码（通常是0）
+        self._xform_cache = UsdGeom.XformCache(self._tc)
+        
         # 从根节点开始遍历
         root_prim = stage.GetPseudoRoot()
-        self._traverse_prim(root_prim, parent_link=None, is_root=True)
+        self._traverse_prim(root_prim)
         
         # 生成XML文件
-        tree = ET.ElementTree(self.urdf_root)
-        tree.write(urdf_output_path, encoding="utf-8", xml_declaration=True)
+        self._write_urdf(urdf_output_path)
         print(f"URDF已保存至: {urdf_output_path}")
     
-    def _traverse_prim(self, prim, parent_link, is_root=False):
-        """递归遍历USD Prim，构建URDF结构"""
-        prim_path = prim.GetPath().pathString
-        
-        # 跳过已处理的Link
-        if prim_path in self.visited_links:
-            return
-            
-        self.visited_links.add(prim_path)
-        
-        # 获取当前Prim的变换矩阵（累积父级变换）
-        xformable = UsdGeom.Xformable(prim)
-        time_code = Usd.TimeCode.Default()  # 使用默认时间码（通常是0）
-        local_transform = xformable.ComputeLocalToWorldTransform(time_code)
-        if self.transform_stack:
-            parent_transform = self.transform_stack[-1]
-            local_transform = parent_transform * local_transform
-            
-        # 处理伪根节点（特殊情况）
-        if prim.IsPseudoRoot():
-            # 伪根节点没有类型名称，直接遍历其子节点
-            self.transform_stack.append(local_transform)
-            for child_prim in prim.GetChildren():
-                self._traverse_prim(child_prim, parent_link, is_root=False)
-            self.transform_stack.pop()
-            return
-        
-        # 处理Xform类型（变换层级）
-        if prim.GetTypeName() == "Xform":
-            self.transform_stack.append(local_transform)
-            for child_prim in prim.GetChildren():
-                self._traverse_prim(child_prim, parent_link, is_root=False)
-            self.transform_stack.pop()
-            return
+    def _traverse_prim(self, root_prim):
+        """用显式栈深度优先遍历USD Prim，构建URDF结构"""
+        # 栈元素为 (prim, 父Link名称)
+        stack = deque([(root_prim, None)])
+        while stack:
+            prim, parent_link = stack.pop()
+            prim_path = prim.GetPath().pathString
             
-        # 处理Link（几何实体）
-        if self._is_geometric_prim(prim):
-            link_name = self._generate_link_name(prim_path)
-            link = self._create_link(link_name, prim, local_transform)
+            # 类型名称只取一次，既用于判断Xform也用于查找几何处理函数
+            type_name = prim.GetTypeName()
+            handler = self._GEOM_HANDLERS.get(type_name)
             
-            # 创建Joint（非根节点时）
-            if not is_root and parent_link:
-                joint_name = self._generate_joint_name(prim_path)
-                self._create_joint(joint_name, parent_link, link, local_transform)
+            # 伪根节点没有类型名称，与Xform类型（变换层级）一样直接遍历其子节点
+            if prim.IsPseudoRoot() or type_name == "Xform":
+                child_link = parent_link
+            # 处理Link（几何实体）
+            elif handler is not None:
+                # XformCache 返回的已是世界变换（包含所有父级），直接使用，无需再乘父级变换
+                world_transform = _to_np4(self._xform_cache.GetLocalToWorldTransform(prim))
+                link_name = self._generate_link_name(prim_path)
+                link = self._create_link(link_name, prim, world_transform, handler)
+                
+                # 创建Joint（存在父Link时）
+                if parent_link:
+                    joint_name = self._generate_joint_name(prim_path)
+                    self._create_joint(joint_name, parent_link, link, world_transform)
+                child_link = link
+            else:
+                continue
             
-            # 继续遍历子节点
-            for child_prim in prim.GetChildren():
-                self._traverse_prim(child_prim, link, is_root=False)
-    
-    def _is_geometric_prim(self, prim):
-        """判断Prim是否为几何实体（可作为Link）"""
-        return prim.IsA(UsdGeom.Mesh) or prim.IsA(UsdGeom.Cylinder) or \
-               prim.IsA(UsdGeom.Sphere) or prim.IsA(UsdGeom.Cone)
+            # 子节点逆序入栈，保证出栈顺序与递归先序遍历一致
+            for child_prim in reversed(prim.GetChildren()):
+                stack.append((child_prim, child_link))
     
     def _generate_link_name(self, prim_path):
         """生成唯一的Link名称"""
-        base_name = os.path.basename(prim_path).replace("/", "_")
+        if (name := self._name_cache.get(prim_path)):
+            return name
+        # Prim路径固定以 "/" 分隔，末段本身不含 "/"，无需再替换
+        base_name = prim_path.rpartition("/")[2]
         if not base_name:
             base_name = f"link_{self.link_id_counter}"
             self.link_id_counter += 1
+        self._name_cache[prim_path] = base_name
         return base_name
     
     def _generate_joint_name(self, prim_path):
         """生成唯一的Joint名称"""
-        base_name = os.path.basename(prim_path).replace("/", "_") + "_joint"
+        key = prim_path + "#j"
+        if (name := self._name_cache.get(key)):
+            return name
+        base_name = prim_path.rpartition("/")[2] + "_joint"
         if not base_name:
             base_name = f"joint_{self.joint_id_counter}"
             self.joint_id_counter += 1
+        self._name_cache[key] = base_name
         return base_name
     
-    def _create_link(self, link_name, prim, transform):
-        """创建URDF Link节点，包含几何和惯性信息"""
-        link = ET.SubElement(self.urdf_root, "link", name=link_name)
-        
-        # 转换变换矩阵为URDF的origin
-        origin = self._transform_to_origin(transform)
-        if origin:
-            link.append(origin)
-        
-        # 添加几何信息
-        visual = ET.SubElement(link, "visual")
-        visual.append(ET.SubElement(visual, "origin"))
-        geometry = ET.SubElement(visual, "geometry")
-        
-        if prim.IsA(UsdGeom.Mesh):
-            self._add_mesh_geometry(geometry, prim)
-        elif prim.IsA(UsdGeom.Cylinder):
-            self._add_cylinder_geometry(geometry, prim)
-        elif prim.IsA(UsdGeom.Sphere):
-            self._add_sphere_geometry(geometry, prim)
-        elif prim.IsA(UsdGeom.Cone):
-            self._add_cone_geometry(geometry, prim)
-        
-        # 添加碰撞信息（简化为视觉几何）
-        collision = ET.SubElement(link, "collision")
-        collision.append(ET.SubElement(collision, "origin"))
-        collision_geometry = ET.SubElement(collision, "geometry")
-        
-        # 修正后代码
-        if len(geometry):
-            geom_element = geometry[0]
-            new_element = ET.Element(geom_element.tag, geom_element.attrib)
-            new_element.text = geom_element.text
-            new_element.tail = geom_element.tail
-            collision_geometry.append(new_element)
-        
-        
-        # 添加惯性信息（默认值，需根据实际模型调整）
-        inertia = ET.SubElement(link, "inertial")
-        inertia.append(ET.SubElement(inertia, "mass", value="1.0"))
-        inertia.append(ET.SubElement(inertia, "inertia", 
-                                    ixx="0.1", ixy="0.0", ixz="0.0",
-                                    iyy="0.1", iyz="0.0", izz="0.1"))
-        
+    def _create_link(self, link_name, prim, transform, handler):
+        """记录URDF Link及其几何信息，origin在写出时统一计算"""
+        geometry = handler(self, prim)
+        self._records.append(("link", link_name, geometry, transform))
         return link_name
     
-    def _add_mesh_geometry(self, parent, prim):
-        """添加Mesh几何到URDF"""
+    def _add_mesh_geometry(self, prim):
+        """返回Mesh几何的URDF标签和属性"""
         mesh = UsdGeom.Mesh(prim)
-        mesh_element = ET.SubElement(parent, "mesh")
         
         # 获取USD中的USDZ格式引用（若有）
         # 或直接生成STL数据（需额外处理）
         # 此处简化为引用外部STL文件
         usd_prim_path = prim.GetPath().pathString
         stl_path = f"{usd_prim_path.replace('/', '_')}.stl"
-        mesh_element.set("filename", stl_path)
+        return "mesh", {"filename": stl_path}
     
-    def _add_cylinder_geometry(self, parent, prim):
-        """添加圆柱体几何到URDF"""
+    def _add_cylinder_geometry(self, prim):
+        """返回圆柱体几何的URDF标签和属性"""
         cylinder = UsdGeom.Cylinder(prim)
         radius = cylinder.GetRadiusAttr().Get() or 0.1
         height = cylinder.GetHeightAttr().Get() or 0.2
-        cylinder_element = ET.SubElement(parent, "cylinder", 
-                                        radius=f"{radius}", length=f"{height}")
+        return "cylinder", {"radius": f"{radius}", "length": f"{height}"}
     
-    def _add_sphere_geometry(self, parent, prim):
-        """添加球体几何到URDF"""
+    def _add_sphere_geometry(self, prim):
+        """返回球体几何的URDF标签和属性"""
         sphere = UsdGeom.Sphere(prim)
         radius = sphere.GetRadiusAttr().Get() or 0.1
-        sphere_element = ET.SubElement(parent, "sphere", radius=f"{radius}")
+        return "sphere", {"radius": f"{radius}"}
     
-    def _add_cone_geometry(self, parent, prim):
-        """添加圆锥体几何到URDF"""
+    def _add_cone_geometry(self, prim):
+        """返回圆锥体几何的URDF标签和属性"""
         cone = UsdGeom.Cone(prim)
         radius = cone.GetRadiusAttr().Get() or 0.1
         height = cone.GetHeightAttr().Get() or 0.2
-        cone_element = ET.SubElement(parent, "cone", 
-                                    radius=f"{radius}", length=f"{height}")
+        return "cone", {"radius": f"{radius}", "length": f"{height}"}
+    
+    # 几何实体（可作为Link）的类型名称 -> 几何处理函数
+    _GEOM_HANDLERS = {
+        "Mesh": _add_mesh_geometry,
+        "Cylinder": _add_cylinder_geometry,
+        "Sphere": _add_sphere_geometry,
+        "Cone": _add_cone_geometry,
+    }
     
     def _create_joint(self, joint_name, parent_link, child_link, transform):
-        """创建URDF Joint节点"""
-        joint = ET.SubElement(self.urdf_root, "joint", 
-                             name=joint_name, type="fixed")  # 默认为固定关节
-        joint.set("parent", parent_link)
-        joint.set("child", child_link)
-        
-        # 设置关节原点（从变换矩阵提取）
-        origin = self._transform_to_origin(transform)
-        if origin:
-            joint.append(origin)
-    
-    def _transform_to_origin(self, transform):
-        """将变换矩阵转换为URDF的origin节点"""
-        if not transform:
-            return None
-       
-        # 提取平移向量 (x, y, z)
-        translation = (transform[3][0], transform[3][1], transform[3][2])
-        
-        # 提取旋转矩阵
-        rotation_matrix = Gf.Matrix3d(
-            transform[0][0], transform[0][1], transform[0][2],
-            transform[1][0], transform[1][1], transform[1][2],
-            transform[2][0], transform[2][1], transform[2][2]
-        )
-        
-        # 直接从矩阵提取旋转四元数
-        quat = rotation_matrix.ExtractRotation().GetQuat()
+        """记录URDF Joint，origin在写出时统一计算"""
+        self._records.append(("joint", joint_name, (parent_link, child_link), transform))
 
+    def _write_urdf(self, urdf_output_path):
+        """批量计算所有记录的origin，再用XMLGenerator将link/joint依次流式写入文件"""
+        records, self._records = self._records, []
+        if records:
+            xyzs, rpys = self._transform_to_origin(np.array([record[3] for record in records]))
+        else:
+            xyzs = rpys = []
         
-        # 四元数转换为RPY (roll-pitch-yaw)
-        rpy = self._quaternion_to_rpy(quat)
-        
-        origin = ET.Element("origin")
-        origin.set("xyz", f"{translation[0]} {translation[1]} {translation[2]}")
-        
-        if rpy:
-            origin.set("rpy", f"{rpy[0]} {rpy[1]} {rpy[2]}")
-            
-        return origin
+        with open(urdf_output_path, "w", encoding="utf-8") as f:
+            gen = XMLGenerator(f, encoding="utf-8", short_empty_elements=True)
+            gen.startDocument()
+            gen.startElement("robot", {})
+            for (kind, name, detail, _), xyz, rpy in zip(records, xyzs, rpys):
+                origin = {"xyz": f"{xyz[0]} {xyz[1]} {xyz[2]}",
+                          "rpy": f"{rpy[0]} {rpy[1]} {rpy[2]}"}
+                if kind == "link":
+                    _write_link(gen, name, detail, origin)
+                else:
+                    _write_joint(gen, name, detail, origin)
+            gen.endElement("robot")
+            gen.endDocument()
+    
+    def _transform_to_origin(self, transforms):
+        """从 (N, 4, 4) 变换矩阵中批量提取平移向量和rpy，返回两个列表"""
+        # Gf 使用行向量约定：平移在第4行，旋转矩阵需转置为列向量约定
+        xyzs = transforms[:, 3, :3]
+        rotations = transforms[:, :3, :3].transpose(0, 2, 1)
+        # 安装了 numba 时使用编译后的逐矩阵循环，否则用 NumPy 整体计算
+        if njit is not None:
+            rpys = _batch_rot_to_rpy_nb(rotations)
+        else:
+            rpys = _rot_to_rpy(rotations)
+        return xyzs.tolist(), rpys.tolist()
+
+
+def _empty_element(gen, tag, attrs):
+    """写出一个没有子节点的元素"""
+    gen.startElement(tag, attrs)
+    gen.endElement(tag)
+
+
+def _write_link(gen, link_name, geometry, origin):
+    """写出URDF Link节点，包含几何和惯性信息"""
+    gen.startElement("link", {"name": link_name})
+    _empty_element(gen, "origin", origin)
+    
+    # 添加几何信息；碰撞信息简化为视觉几何
+    for tag in ("visual", "collision"):
+        gen.startElement(tag, {})
+        _empty_element(gen, "origin", {})
+        gen.startElement("geometry", {})
+        _empty_element(gen, *geometry)
+        gen.endElement("geometry")
+        gen.endElement(tag)
+    
+    # 添加惯性信息（默认值，需根据实际模型调整）
+    gen.startElement("inertial", {})
+    _empty_element(gen, "mass", {"value": "1.0"})
+    _empty_element(gen, "inertia", {"ixx": "0.1", "ixy": "0.0", "ixz": "0.0",
+                                    "iyy": "0.1", "iyz": "0.0", "izz": "0.1"})
+    gen.endElement("inertial")
+    gen.endElement("link")
+
+
+def _write_joint(gen, joint_name, links, origin):
+    """写出URDF Joint节点（默认为固定关节）"""
+    parent_link, child_link = links
+    gen.startElement("joint", {"name": joint_name, "type": "fixed",
+                               "parent": parent_link, "child": child_link})
+    _empty_element(gen, "origin", origin)
+    gen.endElement("joint")
+
+
+def _to_np4(gf_mat):
+    """将 Gf.Matrix4d 转换为 4x4 的float64 NumPy数组（支持缓冲区协议时直接按内存复制）"""
+    return np.array(gf_mat, dtype=np.float64).reshape(4, 4)
+
+
+def _rot_to_rpy(R):
+    """直接将旋转矩阵（列向量约定，形状 (..., 3, 3)）转换为rpy（roll-pitch-yaw），无需经过四元数"""
+    # 变换可能带缩放，先将每一列归一化为单位向量，再按正交矩阵取角度
+    R = R / np.linalg.norm(R, axis=-2, keepdims=True)
+    r20 = np.clip(R[..., 2, 0], -1.0, 1.0)
+    pitch = np.arcsin(-r20)
+    
+    # 接近万向节锁（pitch ≈ ±90°）时roll与yaw耦合，约定yaw=0，由第二行求roll
+    gimbal = np.abs(r20) > 1 - 1e-6
+    roll = np.where(gimbal,
+                    np.arctan2(-R[..., 1, 2], R[..., 1, 1]),
+                    np.arctan2(R[..., 2, 1], R[..., 2, 2]))
+    yaw = np.where(gimbal, 0.0, np.arctan2(R[..., 1, 0], R[..., 0, 0]))
+    
+    return np.stack((roll, pitch, yaw), axis=-1)
+
+
+def _rot_to_rpy_nb(R):
+    """单个 (3, 3) 旋转矩阵转rpy，使用标量数学函数，公式与 _rot_to_rpy 相同"""
+    # 各列的长度即该轴的缩放，除以后得到正交的旋转部分
+    s0 = math.sqrt(R[0, 0] * R[0, 0] + R[1, 0] * R[1, 0] + R[2, 0] * R[2, 0])
+    s1 = math.sqrt(R[0, 1] * R[0, 1] + R[1, 1] * R[1, 1] + R[2, 1] * R[2, 1])
+    s2 = math.sqrt(R[0, 2] * R[0, 2] + R[1, 2] * R[1, 2] + R[2, 2] * R[2, 2])
+    rpy = np.empty(3)
+    r20 = min(1.0, max(-1.0, R[2, 0] / s0))
+    rpy[1] = math.asin(-r20)
+    if abs(r20) > 1 - 1e-6:
+        rpy[0] = math.atan2(-R[1, 2] / s2, R[1, 1] / s1)
+        rpy[2] = 0.0
+    else:
+        rpy[0] = math.atan2(R[2, 1] / s1, R[2, 2] / s2)
+        rpy[2] = math.atan2(R[1, 0] / s0, R[0, 0] / s0)
+    return rpy
+
+
+def _batch_rot_to_rpy_nb(Rs):
+    """批量将 (N, 3, 3) 的旋转矩阵转换为 (N, 3) 的rpy"""
+    rpys = np.empty((Rs.shape[0], 3))
+    for i in range(Rs.shape[0]):
+        rpys[i] = _rot_to_rpy_nb(Rs[i])
+    return rpys
+
+
+# 安装了 numba 时编译为机器码，显式签名在导入时即完成编译
+if njit is not None:
+    _rot_to_rpy_nb = njit("float64[:](float64[:,:])", cache=True, fastmath=True)(_rot_to_rpy_nb)
+    _batch_rot_to_rpy_nb = njit("float64[:,:](float64[:,:,:])", cache=True, fastmath=True)(_batch_rot_to_rpy_nb)
+
 
-    def _quaternion_to_rpy(self, quat):
-        """四元数(qw, qx, qy, qz)转换为rpy（roll-pitch-yaw）"""
-        # 注意：Gf.Quatd的顺序是 (qw, qx, qy, qz)
-        qw = quat.GetReal()
-        qx, qy, qz = quat.GetImaginary()
-        
-        # 四元数转RPY的标准公式
-        roll = np.arctan2(2 * (qw * qx + qy * qz), 1 - 2 * (qx**2 + qy**2))
-        pitch = np.arcsin(2 * (qw * qy - qz * qx))
-        yaw = np.arctan2(2 * (qw * qz + qx * qy), 1 - 2 * (qy**2 + qz**2))
-        
-        return (roll, pitch, yaw)
 # 使用示例
 if __name__ == "__main__":
     usd_file = "D:\project\SmileX\capture-resource-python\Lightwheel_Refrigerator044/Refrigerator044.usd"  # 替换为实际USD文件路径
@@ -907,19 +907,14 @@ def find_texture_files(material, stage):
                 if id_attr:
                     shader_id = id_attr.Get()
 
-                # 检查是否是纹理节点（终极兼容性方法）
-                is_texture = False
-                if shader_id and "Texture" in shader_id:
-                    is_texture = True
-                else:
-                    # 检查是否有"file"输入
-                    file_input = shader.GetInput("file")
-                    if file_input:
-                        is_texture = True
+                # "file"输入只查询一次，判断纹理节点和读取路径共用
+                file_input = shader.GetInput("file")
+
+                # 检查是否是纹理节点（ID包含 Texture，或者有"file"输入）
+                is_texture = bool(file_input) or bool(shader_id and "Texture" in shader_id)
 
                 if is_texture:
                     # 获取纹理文件路径
-                    file_input = shader.GetInput("file")
                     if file_input and file_input.HasValue():
                         texture_path = file_input.Get()
 
@@ -992,19 +987,14 @@ def find_texture_files_in_shader(shader):
     if id_attr:
         shader_id = id_attr.Get()
 
-    # 检查是否是纹理节点
-    is_texture = False
-    if shader_id and "Texture" in shader_id:
-        is_texture = True
-    else:
-        # 检查是否有"file"输入
-        file_input = shader.GetInput("file")
-        if file_input:
-            is_texture = True
+    # "file"输入只查询一次，判断纹理节点和读取路径共用
+    file_input = shader.GetInput("file")
+
+    # 检查是否是纹理节点（ID包含 Texture，或者有"file"输入）
+    is_texture = bool(file_input) or bool(shader_id and "Texture" in shader_id)
 
     if is_texture:
         # 获取纹理文件路径
-        file_input = shader.GetInput("file")
         if file_input and file_input.HasValue():
             texture_path = file_input.Get()
             texture_type = determine_texture_type(shader.GetPrim().GetName())
@@ -0,0 +1,21 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# 创建带连接池和重试的会话，复用 TCP/TLS 连接
+def create_session(pool_size=16, retries=5, backoff_factor=0.3):
+    """
+    :param pool_size: 连接池大小
+    :param retries: 失败重试次数
+    :param backoff_factor: 重试间隔的退避系数
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=retries, backoff_factor=backoff_factor),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -10,9 +10,18 @@ charset = "utf8mb4"
 
 
 # 用PyMySQL操作数据库
-def get_connection():
+def get_connection(cursorclass=pymysql.cursors.Cursor):
+    """
+    :param cursorclass: 游标类型，传入 pymysql.cursors.SSCursor 时结果集流式读取
+    """
     conn = pymysql.connect(
-        host=host, port=port, db=db, user=user, password=password, charset=charset
+        host=host,
+        port=port,
+        db=db,
+        user=user,
+        password=password,
+        charset=charset,
+        cursorclass=cursorclass,
     )
     return conn
 
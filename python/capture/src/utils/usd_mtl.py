@@ -0,0 +1,427 @@
+import hashlib
+import logging
+import mmap
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from pxr import Sdf, UsdShade
+
+# usdToUrdf 系列转换脚本共用的材质(.mtl)导出和纹理处理
+
+logger = logging.getLogger(__name__)
+
+# 并行复制纹理的线程数
+_TEXTURE_COPY_WORKERS = 8
+# 内核复制时单次调用的最大字节数
+_COPY_CHUNK = 1 << 30
+# copy_file_range / sendfile 只在 Linux 上能用于普通文件之间复制（macOS 的 sendfile 只能写入套接字）
+_KERNEL_COPY = sys.platform.startswith("linux")
+
+# 打开文件的附加标志，不支持的平台上为 0；
+# O_NOATIME 避免读取源纹理时更新访问时间，O_CLOEXEC 保证描述符不会被子进程继承
+_O_NOATIME = getattr(os, "O_NOATIME", 0)
+_O_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+# MTL默认材质属性
+_MTL_DEFAULT_HEADER = (
+    "Ns 96.078431\n"  # 光泽度
+    "Ka 1.000000 1.000000 1.000000\n"  # 环境光颜色
+    "Kd 1.000000 1.000000 1.000000\n"  # 漫反射颜色
+    "Ks 1.000000 1.000000 1.000000\n"  # 镜面反射颜色
+    "Ni 1.000000\n"  # 光学密度
+    "d 1.000000\n"  # 透明度
+    "illum 2\n"  # 光照模型
+)
+
+# MTL中引用纹理的相对路径前缀
+_MTL_MAP_PREFIX = "../textures/"
+
+
+
+@dataclass
+class TextureExport:
+    """一次导出（如一次 export_meshes 调用）中的纹理登记状态，导出结束后丢弃，不会带入下一次转换"""
+
+    textures_dir: str
+    # textures目录中已有或已登记复制的文件名
+    existing: set = field(default_factory=set)
+    # 待复制的纹理 (源文件, 目标文件, 纹理类型)
+    tasks: list = field(default_factory=list)
+    # 源文件路径或真实路径 -> MTL中的引用路径
+    refs: dict = field(default_factory=dict)
+    # 内容哈希 -> MTL中的引用路径，内容相同但文件名不同的纹理只保留一份
+    digests: dict = field(default_factory=dict)
+
+    @classmethod
+    def for_dir(cls, textures_dir):
+        """读取一次textures目录，创建登记状态"""
+        return cls(textures_dir, list_texture_dir(textures_dir))
+
+    def discard(self, failed_refs):
+        """移除复制失败的纹理的登记，之后再引用时会重新登记复制"""
+        self.existing.difference_update(
+            ref[len(_MTL_MAP_PREFIX):] for ref in failed_refs
+        )
+        self.refs = {k: v for k, v in self.refs.items() if v not in failed_refs}
+        self.digests = {k: v for k, v in self.digests.items() if v not in failed_refs}
+
+
+# 纹理类型判断规则，按优先级排列，名称包含任一关键字即为该类型
+_TEX_RULES = (
+    (("diffuse", "albedo", "basecolor"), "diffuse"),
+    (("normal", "bump"), "normal"),
+    (("roughness",), "roughness"),
+    (("metallic", "metalness"), "metallic"),
+    (("specular",), "specular"),
+    (("emissive",), "emissive"),
+    (("opacity", "alpha"), "opacity"),
+)
+
+# 关键字 -> (优先级, 纹理类型)
+_TEX_KEYWORDS = {
+    keyword: (priority, texture_type)
+    for priority, (keywords, texture_type) in enumerate(_TEX_RULES)
+    for keyword in keywords
+}
+
+# 所有关键字合成一个预编译正则，一次扫描找出名称中出现的全部关键字
+_TEX_TYPE_RE = re.compile("|".join(_TEX_KEYWORDS), re.IGNORECASE)
+
+
+def write_material_file(
+    material,
+    mtl_path,
+    textures_dir,
+    stage,
+    texture_files=None,
+    textures=None,
+):
+    """写入材质文件(.mtl)并处理纹理
+
+    texture_files 为已查找到的纹理，为空时重新查找；
+    textures 为调用方创建的 TextureExport，待复制的纹理由调用方统一并行复制；
+    为空时只为本次调用创建，并在本函数末尾复制
+    """
+    copy_now = textures is None
+    if copy_now:
+        textures = TextureExport.for_dir(textures_dir)
+    try:
+        with open(mtl_path, "w", buffering=1 << 16) as f:
+            material_name = material.GetPrim().GetName()
+            # 文件头、材质名和默认材质属性一次写入
+            f.write(f"# Material file\nnewmtl {material_name}\n{_MTL_DEFAULT_HEADER}")
+
+            # 提取纹理信息
+            if texture_files is None:
+                texture_files = find_texture_files(material, stage)
+
+            # 处理基础颜色/漫反射纹理
+            if "diffuse" in texture_files:
+                try:
+                    ref = _export_texture(
+                        texture_files["diffuse"],
+                        "纹理",
+                        textures,
+                    )
+
+                    # 在MTL文件中引用纹理
+                    f.write(f"map_Kd {ref}\n")
+                except Exception as e:
+                    logger.error(f"复制纹理失败: {e}")
+
+            # 处理法线贴图
+            if "normal" in texture_files:
+                try:
+                    ref = _export_texture(
+                        texture_files["normal"],
+                        "法线贴图",
+                        textures,
+                    )
+
+                    # 在MTL文件中引用法线贴图
+                    f.write(f"map_bump {ref}\n")
+                except Exception as e:
+                    logger.error(f"复制法线贴图失败: {e}")
+
+            # 处理其他纹理类型（如粗糙度、金属度等）
+            for tex_type, tex_path in texture_files.items():
+                if tex_type not in ["diffuse", "normal"]:
+                    try:
+                        ref = _export_texture(
+                            tex_path,
+                            f"{tex_type}贴图",
+                            textures,
+                        )
+
+                        # 根据纹理类型写入适当的MTL指令
+                        if tex_type == "roughness":
+                            f.write(f"map_Pr {ref}\n")
+                        elif tex_type == "metallic":
+                            f.write(f"map_Pm {ref}\n")
+                        # 可以添加更多纹理类型映射
+
+                    except Exception as e:
+                        logger.error(f"复制{tex_type}贴图失败: {e}")
+
+            logger.info(f"成功导出材质文件到 {mtl_path}")
+
+    except Exception as e:
+        logger.error(f"导出材质文件失败: {e}")
+
+    if copy_now:
+        copy_textures(textures)
+
+
+def _texture_digest(path):
+    """计算纹理文件内容的 BLAKE2b 哈希，读取和哈希都在 C 层完成"""
+    with os.fdopen(_open_source(path), "rb") as f:
+        # Python 3.11+ 由 file_digest 直接读入缓冲区计算
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "blake2b").hexdigest()
+
+        # 旧版本将整个文件映射到内存后一次计算，空文件不能映射
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.blake2b().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.blake2b(mm).hexdigest()
+
+
+def list_texture_dir(textures_dir):
+    """一次读取textures目录，返回已有的文件名集合"""
+    with os.scandir(textures_dir) as entries:
+        return {entry.name for entry in entries}
+
+
+def _open_source(path):
+    """只读打开纹理源文件，读取时不更新访问时间
+
+    O_NOATIME 只允许文件属主或有权限的进程使用，否则返回 EPERM，此时去掉该标志重新打开
+    """
+    flags = os.O_RDONLY | _O_CLOEXEC
+    if _O_NOATIME:
+        try:
+            return os.open(path, flags | _O_NOATIME)
+        except PermissionError:
+            pass
+    return os.open(path, flags)
+
+
+def _fast_copy(src, dst):
+    """只复制文件内容，不复制元数据
+
+    Linux 上优先用 copy_file_range / sendfile 在内核中完成复制，不经过用户态缓冲区；
+    其他平台或内核复制失败时退回 shutil.copyfile
+    """
+    if _KERNEL_COPY:
+        try:
+            _kernel_copy(src, dst)
+            return
+        except OSError as e:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"内核复制失败，改用 shutil.copyfile: {e}")
+    shutil.copyfile(src, dst)
+
+
+def _kernel_copy(src, dst):
+    """用 copy_file_range / sendfile 复制文件内容，仅用于 Linux"""
+    src_fd = _open_source(src)
+    try:
+        dst_fd = os.open(
+            dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_CLOEXEC, 0o644
+        )
+        try:
+            copy_range = getattr(os, "copy_file_range", None)
+            while True:
+                if copy_range is not None:
+                    try:
+                        copied = copy_range(src_fd, dst_fd, _COPY_CHUNK)
+                    except OSError:
+                        # 跨文件系统等不支持的情况改用 sendfile，文件偏移已随复制前进
+                        copy_range = None
+                        continue
+                else:
+                    copied = os.sendfile(dst_fd, src_fd, None, _COPY_CHUNK)
+                if copied == 0:
+                    break
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+
+def copy_textures(textures):
+    """用线程池并行复制 TextureExport 中登记的纹理
+
+    复制失败的纹理删除残留的目标文件，并从登记状态中移除
+    """
+    tasks, textures.tasks = textures.tasks, []
+    if not tasks:
+        return
+
+    def copy_one(task):
+        src_texture, dest_texture, label = task
+        try:
+            _fast_copy(src_texture, dest_texture)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"复制{label}: {src_texture} -> {dest_texture}")
+            return None
+        except Exception as e:
+            logger.error(f"复制{label}失败: {e}")
+            try:
+                os.remove(dest_texture)
+            except OSError:
+                pass
+            return _MTL_MAP_PREFIX + os.path.basename(dest_texture)
+
+    with ThreadPoolExecutor(
+        max_workers=min(_TEXTURE_COPY_WORKERS, len(tasks))
+    ) as executor:
+        # 等待所有复制完成
+        failed_refs = {ref for ref in executor.map(copy_one, tasks) if ref is not None}
+
+    if failed_refs:
+        textures.discard(failed_refs)
+
+
+def _export_texture(src_texture, label, textures):
+    """登记要复制到textures目录的纹理，返回MTL中引用的路径
+
+    依次按源文件路径、真实路径、目标文件名查找，都未命中时才读取文件计算内容哈希，
+    内容相同的源文件只登记一次；目标是否已存在通过 textures.existing 判断，不再逐个 stat；
+    实际复制由 copy_textures 统一完成
+    """
+    # 着色器的 file 输入是 Sdf.AssetPath，优先使用解析后的路径
+    if isinstance(src_texture, Sdf.AssetPath):
+        src_texture = src_texture.resolvedPath or src_texture.path
+
+    # 先按原始路径查找，命中时省去 realpath 的逐级解析
+    ref = textures.refs.get(src_texture)
+    if ref is not None:
+        return ref
+
+    real_path = os.path.realpath(src_texture)
+    ref = textures.refs.get(real_path)
+    if ref is not None:
+        textures.refs[src_texture] = ref
+        return ref
+
+    # 文件名只解析一次，目标路径和MTL引用路径都由它拼出
+    base = os.path.basename(src_texture)
+    ref = _MTL_MAP_PREFIX + base
+
+    # 目标文件已存在或已登记复制，无需读取源文件
+    if base in textures.existing:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"{label}已存在: {os.path.join(textures.textures_dir, base)}")
+    else:
+        digest = _texture_digest(real_path)
+        same_content = textures.digests.get(digest)
+        if same_content is not None:
+            ref = same_content
+        else:
+            # 复制纹理文件
+            dest_texture = os.path.join(textures.textures_dir, base)
+            textures.tasks.append((src_texture, dest_texture, label))
+            textures.existing.add(base)
+            textures.digests[digest] = ref
+
+    textures.refs[src_texture] = textures.refs[real_path] = ref
+    return ref
+
+
+def find_texture_files(material, stage):
+    """查找材质网络中的所有纹理文件"""
+    return _walk_shader_network(material)
+
+
+# 表面着色器上可能连接纹理的常见输入名称
+_SURFACE_TEXTURE_INPUTS = (
+    "diffuseColor",
+    "baseColor",
+    "normal",
+    "roughness",
+    "metallic",
+    "specularColor",
+)
+
+
+def _is_surface_shader(shader):
+    """着色器ID包含 Surface，或者有"surface"输出即为表面着色器"""
+    id_attr = shader.GetIdAttr()
+    shader_id = id_attr.Get() if id_attr else None
+    return bool(shader_id and "Surface" in shader_id) or bool(shader.GetOutput("surface"))
+
+
+def _walk_shader_network(material):
+    """用工作栈遍历材质的着色器网络，收集纹理文件
+
+    材质输出直接连接的着色器按输出名称判断纹理类型；其中的表面着色器再沿常见的纹理输入向上查找一层，
+    这些纹理按着色器名称判断类型。出栈顺序与逐个输出嵌套查找时一致，同名纹理类型仍由后找到的覆盖；
+    同一着色器以相同名称只访问一次
+    """
+    texture_files = {}
+
+    # 栈元素为 (着色器, 用于判断纹理类型的名称, 是否由材质输出直接连接)，逆序入栈保证按原顺序出栈
+    worklist = []
+    for output in reversed(material.GetOutputs()):
+        for connection in reversed(output.GetConnectedSources()[0]):
+            if not connection.IsValid():
+                continue
+            if not connection.source:
+                logger.warning(f"连接源基本体无效: {connection}")
+                continue
+            worklist.append((connection.source, output.GetBaseName(), True))
+
+    visited = set()
+    while worklist:
+        source, type_hint, from_output = worklist.pop()
+
+        # 检查是否是着色器
+        shader = UsdShade.Shader(source)
+        if not shader:
+            continue
+        shader_prim = shader.GetPrim()
+        if type_hint is None:
+            type_hint = shader_prim.GetName()
+        visit_key = (shader_prim.GetPath(), type_hint)
+        if visit_key in visited:
+            continue
+        visited.add(visit_key)
+
+        # 只有带值的"file"输入才能导出纹理，ID是否包含 Texture 不影响结果，不再查询ID；
+        # "file"输入只查询一次，未设置值时 Get 返回 None，省去 HasValue 的再次查询
+        file_input = shader.GetInput("file")
+        if file_input:
+            texture_path = file_input.Get()
+            if texture_path is not None:
+                # 确定纹理类型
+                texture_type = determine_texture_type(type_hint)
+                texture_files[texture_type] = texture_path
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"找到{texture_type}纹理: {texture_path}")
+
+        # 只有材质输出直接连接的表面着色器，才沿常见的纹理输入继续查找一层
+        if not from_output or not _is_surface_shader(shader):
+            continue
+        for input_name in reversed(_SURFACE_TEXTURE_INPUTS):
+            shader_input = shader.GetInput(input_name)
+            if not shader_input:
+                continue
+            for conn in reversed(shader_input.GetConnectedSources()[0]):
+                if conn.IsValid() and conn.source:
+                    worklist.append((conn.source, None, False))
+
+    return texture_files
+
+
+def determine_texture_type(name):
+    """根据名称确定纹理类型，出现多个关键字时取规则中靠前的类型"""
+    matches = _TEX_TYPE_RE.findall(name)
+    if matches:
+        return min(_TEX_KEYWORDS[match.lower()] for match in matches)[1]
+    return "unknown_" + name.lower()